@@ -1,160 +1,102 @@
 from __future__ import annotations
 
-import asyncio
-import itertools
-import sys
 from dataclasses import dataclass, field
-from enum import Enum, auto
-from typing import Callable, Iterator, Literal
+from pathlib import Path
+from typing import Iterable
 
-HALT = 99
-
-
-POSITION_MODE = 0
-IMMEDIATE_MODE = 1
-
-ParamMode = Literal[POSITION_MODE, IMMEDIATE_MODE]
-OpCode = int
-
-
-class ParamType(Enum):
-    VALUE = auto()
-    LOCATION = auto()
-
-
-class Unknown(Exception):
-    def __init__(self, op_code: int):
-        self.op_code = op_code
-        super().__init__()
+from intcode import Processor, Status, create, load
+from intcode.scheduler import Scheduler
 
 
 def read_code() -> list[int]:
-    with open("d7/input.txt", "r") as f:
-        return [int(i) for i in f.read().split(",")]
-
-
-def parse_op_code(raw_op_code: int,) -> tuple[OpCode, list[ParamMode]]:
-    str_op_code = f"{raw_op_code:05}"
-    return (
-        int(str_op_code[3:]),
-        [int(str_op_code[2]), int(str_op_code[1]), int(str_op_code[0])],
-    )
-
-
-SPEC: dict[OpCode, tuple[Callable, list[ParamType]]] = {}
+    return load(Path(__file__).parent / "input.txt")
 
 
-def handler(op_code: OpCode, params: list[ParamType]):
-    def wrapper(fn):
-        SPEC[op_code] = (fn, params)
-        return fn
+# 0-4, or 5-9 when the amplifiers run in a feedback loop.
+Phase = int
 
-    return wrapper
 
+def run_loop(processors: list[Processor]) -> None:
+    scheduler = Scheduler()
+    scheduler.extend(processors)
+    scheduler.run()
 
-@dataclass
-class Processor:
-    code: list[int]
-    inputs: asyncio.Queue
-    outputs: asyncio.Queue
-
-    i: int = field(init=False, default=0)
-
-    def _consume_params(
-        self, param_types: list[ParamType], param_modes: list[ParamMode]
-    ) -> Iterator[int]:
-        params = zip(
-            self.code[self.i + 1 : self.i + len(param_types) + 1],
-            param_types,
-            param_modes,
-        )
-        self.i += len(param_types) + 1
-        for value, param_type, param_mode in params:
-            if param_type == ParamType.VALUE:
-                if param_mode == POSITION_MODE:
-                    yield self.code[value]
-                    continue
-            yield value
-
-    async def run(self):
-        while self.i < len(self.code):
-            op_code, param_modes = parse_op_code(self.code[self.i])
-            if op_code == HALT:
-                return
-            handler, param_types = SPEC[op_code]
-            params = tuple(self._consume_params(param_types, param_modes))
-            await handler(self, *params)
 
-    @handler(1, [ParamType.VALUE, ParamType.VALUE, ParamType.LOCATION])
-    async def add(self, a, b, loc):
-        self.code[loc] = a + b
+@dataclass(frozen=True)
+class Chain:
+    """Amplifiers after the first pass of a signal through a phase prefix.
 
-    @handler(2, [ParamType.VALUE, ParamType.VALUE, ParamType.LOCATION])
-    async def mul(self, a, b, loc):
-        self.code[loc] = a * b
+    The processors are shared between every chain extending this prefix and
+    are never run again; they are forked to finish a feedback loop.
+    """
 
-    @handler(3, [ParamType.LOCATION])
-    async def input(self, loc):
-        self.code[loc] = await self.inputs.get()
+    processors: tuple[Processor, ...]
+    signal: int
 
-    @handler(4, [ParamType.LOCATION])
-    async def output(self, loc):
-        await self.outputs.put(self.code[loc])
 
-    @handler(5, [ParamType.VALUE, ParamType.VALUE])
-    async def jump_if_true(self, a, b):
-        if a != 0:
-            self.i = b
-
-    @handler(6, [ParamType.VALUE, ParamType.VALUE])
-    async def jump_if_false(self, a, b):
-        if a == 0:
-            self.i = b
-
-    @handler(7, [ParamType.VALUE, ParamType.VALUE, ParamType.LOCATION])
-    async def less_than(self, a, b, loc):
-        self.code[loc] = 1 if a < b else 0
-
-    @handler(8, [ParamType.VALUE, ParamType.VALUE, ParamType.LOCATION])
-    async def equals(self, a, b, loc):
-        self.code[loc] = 1 if a == b else 0
-
-
-Phase = Literal[0, 1, 2, 3]
-
-
-async def run_amplifier(
-    input: int, phases: tuple[Phase, Phase, Phase, Phase, Phase]
-) -> int:
-    code = read_code()
-    output_queue = input_queue = queue = asyncio.Queue()
-
-    processors = [
-        Processor(code.copy(), inputs=queue, outputs=(queue := asyncio.Queue()),)
-        for phase in phases
-    ]
-
-    processors[-1].outputs = input_queue
-
-    for processer, phase in zip(processors, phases):
-        processer.inputs.put_nowait(phase)
-
-    input_queue.put_nowait(input)
+@dataclass
+class PermutationEvaluator:
+    """Evaluate phase permutations, running each distinct prefix only once.
 
-    await asyncio.gather(*(p.run() for p in processors))
+    Permutations are walked as a tree so a prefix such as ``(5, 6)`` is
+    computed once for all six permutations that start with it.
+    """
 
-    return await output_queue.get()
+    code: list[int]
+    chains: dict[tuple[tuple[Phase, ...], int], Chain] = field(
+        init=False, default_factory=dict
+    )
 
+    def __post_init__(self):
+        self.template = create(self.code)
+
+    def extend(
+        self, prefix: tuple[Phase, ...], phase: Phase, chain: Chain
+    ) -> Chain:
+        key = (prefix + (phase,), chain.signal)
+        if key not in self.chains:
+            processer = self.template.fork()
+            processer.inputs.put_nowait(phase)
+            processer.inputs.put_nowait(chain.signal)
+            while processer.run_until_blocked() is Status.OUTPUT:
+                pass
+            self.chains[key] = Chain(
+                (*chain.processors, processer), processer.outputs.get_nowait()
+            )
+        return self.chains[key]
+
+    def finish(self, chain: Chain) -> int:
+        if all(processer.halted for processer in chain.processors):
+            return chain.signal
+
+        processors = [processer.fork() for processer in chain.processors]
+        for processer, following in zip(processors, [*processors[1:], processors[0]]):
+            processer.outputs = following.inputs
+        processors[0].inputs.put_nowait(chain.signal)
+        run_loop(processors)
+        return processors[0].inputs.get_nowait()
+
+    def walk(
+        self, prefix: tuple[Phase, ...], remaining: frozenset[Phase], chain: Chain
+    ) -> int:
+        if not remaining:
+            return self.finish(chain)
+        return max(
+            self.walk(
+                prefix + (phase,),
+                remaining - {phase},
+                self.extend(prefix, phase, chain),
+            )
+            for phase in sorted(remaining)
+        )
 
-def generate_inputs():
-    return itertools.permutations(range(5, 10))
+    def max_signal(self, phases: Iterable[Phase], signal: int = 0) -> int:
+        return self.walk((), frozenset(phases), Chain((), signal))
 
 
-async def main():
-    print(max([await run_amplifier(0, phases) for phases in generate_inputs()]))
+def main():
+    print(PermutationEvaluator(read_code()).max_signal(range(5, 10)))
 
 
 if __name__ == "__main__":
-    asyncio.run(main(), debug=True)
-    # print(amplifier(0, (0,1,2,3,4)))
-    # print(max(amplifier(0, phases) for phases in generate_inputs()))
+    main()
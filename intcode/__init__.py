@@ -0,0 +1,25 @@
+from .backends import BACKENDS, DEFAULT_BACKEND, ReferenceProcessor, create
+from .channel import Channel
+from .compiler import CompiledProcessor
+from .memory import PAGE_SIZE, Memory
+from .processor import (
+    HALT,
+    IMMEDIATE_MODE,
+    POSITION_MODE,
+    RELATIVE_MODE,
+    SPEC,
+    DISPATCH,
+    BaseProcessor,
+    Instruction,
+    Operation,
+    ParamType,
+    Processor,
+    Snapshot,
+    Status,
+    decode,
+    dispatch,
+    handler,
+    load,
+    parse_op_code,
+)
+from .profiler import Profiler
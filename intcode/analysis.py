@@ -0,0 +1,258 @@
+"""Static control-flow analysis of Intcode programs.
+
+Print the map of a program with::
+
+    python -m intcode.analysis d5/input.txt
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from .processor import (
+    HALT,
+    IMMEDIATE_MODE,
+    POSITION_MODE,
+    Instruction,
+    ParamType,
+    decode,
+    load,
+)
+
+JUMPS = {5, 6}
+
+
+@dataclass(frozen=True)
+class BasicBlock:
+    """Straight-line instructions from ``start`` up to (not including) ``end``."""
+
+    start: int
+    end: int
+    # Addresses control can continue at; empty after a halt or unknown jump.
+    successors: tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class ProgramMap:
+    """What can be recovered about a program before it runs.
+
+    Instructions are found by following fall-through and jumps to immediate
+    targets from address 0. A jump through memory has unknown targets, and
+    the map is then incomplete: code only reached that way is missing. So
+    it is when the program rewrites an opcode, or a write or jump operand,
+    of an instruction found: that instruction may then write or jump
+    somewhere the map doesn't know about. Writes through relative mode have
+    unknown targets too.
+    """
+
+    size: int
+    instructions: dict[int, Instruction]
+    blocks: dict[int, BasicBlock]
+    jump_targets: frozenset[int]
+    # Jumps whose target is read from memory.
+    indirect_jumps: frozenset[int]
+    # Reachable addresses that don't hold a valid instruction yet, which the
+    # program must patch before getting there.
+    undecoded: frozenset[int]
+    # Instructions writing a fixed address covered by code.
+    self_modifying: frozenset[int]
+    # Instructions writing a cell that decides which instruction another one
+    # is, or where it writes or jumps.
+    steering_writes: frozenset[int]
+    # Instructions writing through relative mode, which may hit anything.
+    unknown_writes: frozenset[int]
+    # Every cell belonging to a found instruction.
+    code: frozenset[int]
+    # Fixed addresses written by found instructions.
+    written: frozenset[int]
+
+    @property
+    def complete(self) -> bool:
+        """Every instruction that can run was found."""
+        return (
+            not self.indirect_jumps
+            and not self.undecoded
+            and not self.steering_writes
+        )
+
+    @functools.cached_property
+    def read_only(self) -> frozenset[int]:
+        """Code cells no instruction can ever write.
+
+        Empty unless the whole program was found and every write has a
+        fixed target, since anything else may write anywhere.
+        """
+        if not self.complete or self.unknown_writes:
+            return frozenset()
+        return self.code - self.written
+
+    def is_code(self, address: int) -> bool:
+        return address in self.code
+
+    def regions(self) -> Iterator[tuple[str, range]]:
+        """Split the loaded program into runs of ``code`` and ``data`` cells."""
+        start = 0
+        for address in range(1, self.size + 1):
+            if address < self.size and self.is_code(address) == self.is_code(start):
+                continue
+            kind = "code" if self.is_code(start) else "data"
+            yield kind, range(start, address)
+            start = address
+
+
+def _decode(code: list[int], address: int) -> Optional[Instruction]:
+    def cell(index: int) -> int:
+        return code[index] if index < len(code) else 0
+
+    try:
+        return decode(cell, address)
+    except (KeyError, ValueError):
+        return None
+
+
+def _steering(address: int, instruction: Instruction) -> list[int]:
+    """The cells deciding which instruction this is and what it writes or
+    where it jumps."""
+    cells = [address]
+    for offset, (param_type, _, _) in enumerate(instruction.params, start=1):
+        if param_type == ParamType.OUTPUT or instruction.op_code in JUMPS:
+            cells.append(address + offset)
+    return cells
+
+
+def _successors(address: int, instruction: Instruction) -> tuple[list[int], bool]:
+    """Where control goes after ``instruction``, jump target first, and
+    whether that is all of it."""
+    following = address + instruction.size
+    if instruction.op_code == HALT:
+        return [], True
+    if instruction.op_code not in JUMPS:
+        return [following], True
+
+    (_, test_mode, test), (_, target_mode, target) = instruction.params
+    if test_mode == IMMEDIATE_MODE:
+        taken = bool(test) == (instruction.op_code == 5)
+        if not taken:
+            return [following], True
+        successors = []
+    else:
+        successors = [following]
+    if target_mode == IMMEDIATE_MODE:
+        return [target, *successors], True
+    return successors, False
+
+
+def analyse(code: list[int]) -> ProgramMap:
+    instructions: dict[int, Instruction] = {}
+    edges: dict[int, list[int]] = {}
+    jump_targets, indirect_jumps, undecoded = set(), set(), set()
+
+    pending = [0]
+    while pending:
+        address = pending.pop()
+        if address in instructions or not 0 <= address < len(code):
+            continue
+        instruction = _decode(code, address)
+        if instruction is None:
+            undecoded.add(address)
+            continue
+        instructions[address] = instruction
+        successors, known = _successors(address, instruction)
+        edges[address] = successors
+        if instruction.op_code in JUMPS:
+            if not known:
+                indirect_jumps.add(address)
+            elif instruction.params[1][1] == IMMEDIATE_MODE:
+                jump_targets.add(instruction.params[1][2])
+        pending.extend(successors)
+
+    cells = frozenset(
+        cell
+        for address, instruction in instructions.items()
+        for cell in range(address, address + instruction.size)
+    ) | undecoded
+    steering = frozenset(
+        cell
+        for address, instruction in instructions.items()
+        for cell in _steering(address, instruction)
+    )
+    written, self_modifying, unknown_writes = set(), set(), set()
+    steering_writes = set()
+    for address, instruction in instructions.items():
+        for param_type, param_mode, value in instruction.params:
+            if param_type != ParamType.OUTPUT:
+                continue
+            if param_mode == POSITION_MODE:
+                written.add(value)
+                if value in cells:
+                    self_modifying.add(address)
+                if value in steering:
+                    steering_writes.add(address)
+            else:
+                unknown_writes.add(address)
+
+    return ProgramMap(
+        len(code),
+        instructions,
+        _blocks(instructions, edges, jump_targets),
+        frozenset(jump_targets),
+        frozenset(indirect_jumps),
+        frozenset(undecoded),
+        frozenset(self_modifying),
+        frozenset(steering_writes),
+        frozenset(unknown_writes),
+        cells,
+        frozenset(written),
+    )
+
+
+def _blocks(
+    instructions: dict[int, Instruction],
+    edges: dict[int, list[int]],
+    jump_targets: set[int],
+) -> dict[int, BasicBlock]:
+    blocks = {}
+    start = None
+    for address in sorted(instructions):
+        instruction = instructions[address]
+        following = address + instruction.size
+        if start is None:
+            start = address
+        ends = (
+            instruction.op_code == HALT
+            or instruction.op_code in JUMPS
+            or following not in instructions
+            or following in jump_targets
+        )
+        if ends:
+            blocks[start] = BasicBlock(start, following, tuple(edges[address]))
+            start = None
+    return blocks
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Map an Intcode program.")
+    parser.add_argument("program")
+    args = parser.parse_args(argv)
+
+    program = analyse(load(args.program))
+    for kind, cells in program.regions():
+        print(f"{cells.start:6}-{cells.stop - 1:<6} {kind}")
+    print(f"{len(program.instructions)} instructions in {len(program.blocks)} blocks")
+    print(f"complete: {program.complete}")
+    for name in (
+        "jump_targets",
+        "indirect_jumps",
+        "undecoded",
+        "self_modifying",
+        "steering_writes",
+        "unknown_writes",
+    ):
+        print(f"{name}: {sorted(getattr(program, name))}")
+    print(f"read only code cells: {len(program.read_only)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+from .compiler import CompiledProcessor
+from .processor import Instruction, Processor, decode
+
+
+class ReferenceProcessor(Processor):
+    """Processor that decodes every instruction as it is executed.
+
+    This is how the days originally ran; it is kept as the baseline the
+    faster backends are checked and measured against.
+    """
+
+    def _decode(self, address: int) -> Instruction:
+        return decode(self.__getitem__, address)
+
+
+BACKENDS: dict[str, type[Processor]] = {
+    "reference": ReferenceProcessor,
+    "decoded": Processor,
+    "compiled": CompiledProcessor,
+}
+# Compiling blocks only pays off on long-running loops (d9); on the other
+# puzzle programs it loses to the decoded interpreter, see ``intcode.bench``.
+DEFAULT_BACKEND = "decoded"
+
+
+def create(code: list[int], *args, backend: Optional[str] = None, **kwargs):
+    """Create a processor for ``code`` on the chosen backend.
+
+    ``backend`` falls back to the ``INTCODE_BACKEND`` environment variable
+    and then ``DEFAULT_BACKEND``, so every day can be switched without
+    changing its code. The remaining arguments go to the processor.
+    """
+    name = backend or os.environ.get("INTCODE_BACKEND") or DEFAULT_BACKEND
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown Intcode backend {name!r}, expected one of {sorted(BACKENDS)}"
+        ) from None
+    return cls(code, *args, **kwargs)
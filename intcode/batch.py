@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import itertools
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+    Optional,
+)
+
+from .backends import create
+from .processor import BaseProcessor, Status
+
+if TYPE_CHECKING:
+    from .memo import RunCache
+
+Worker = Callable[[list[int], Any], Any]
+
+
+@dataclass(frozen=True)
+class Job:
+    """One non-interactive run: memory patches, queued inputs, cells to read."""
+
+    patches: Mapping[int, int] = field(default_factory=dict)
+    inputs: tuple[int, ...] = ()
+    read: tuple[int, ...] = ()
+
+
+@dataclass(frozen=True)
+class Result:
+    outputs: tuple[int, ...]
+    memory: Mapping[int, int]
+    halted: bool
+
+
+# The last processor ``run_job`` created and what for; later jobs on the
+# same program and backend reset it instead of creating their own.
+_reusable: Optional[tuple[list[int], Optional[str], BaseProcessor]] = None
+
+
+def _processor(code: list[int], patches: Mapping[int, int]) -> BaseProcessor:
+    global _reusable
+    backend = os.environ.get("INTCODE_BACKEND")
+    if _reusable is not None and _reusable[1] == backend and _reusable[0] == code:
+        processor = _reusable[2]
+        processor.reset(patches)
+        return processor
+    processor = create(code)
+    for address, value in patches.items():
+        processor[address] = value
+    _reusable = (list(code), backend, processor)
+    return processor
+
+
+def run_job(code: list[int], job: Job) -> Result:
+    """Run ``code`` to completion, or until it asks for input it wasn't given."""
+    processor = _processor(code, job.patches)
+    for value in job.inputs:
+        processor.inputs.put_nowait(value)
+    while (status := processor.run_until_blocked()) is Status.OUTPUT:
+        pass
+    outputs = []
+    while not processor.outputs.empty():
+        outputs.append(processor.outputs.get_nowait())
+    return Result(
+        tuple(outputs),
+        {address: processor[address] for address in job.read},
+        status is Status.HALTED,
+    )
+
+
+# Per worker process state, shipped once by ``_initialise``.
+_code: list[int] = []
+_worker: Worker = run_job
+
+
+def _initialise(code: list[int], worker: Worker) -> None:
+    global _code, _worker
+    _code, _worker = code, worker
+
+
+def _chunked(jobs: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    jobs = iter(jobs)
+    while chunk := list(itertools.islice(jobs, size)):
+        yield chunk
+
+
+def _run_chunk(jobs: list[Any]) -> list[tuple[Any, Any]]:
+    return [(job, _worker(_code, job)) for job in jobs]
+
+
+def run_batch(
+    code: list[int],
+    jobs: Iterable[Any],
+    *,
+    worker: Worker = run_job,
+    until: Optional[Callable[[Any, Any], bool]] = None,
+    processes: Optional[int] = None,
+    chunksize: int = 256,
+    cache: Optional[RunCache] = None,
+) -> Iterator[tuple[Any, Any]]:
+    """Spread independent runs of ``code`` over a process pool.
+
+    The program is sent to each worker once and ``worker(code, job)`` is
+    called for every job, ``run_job`` by default; custom workers must be
+    importable module level functions. ``(job, result)`` pairs are yielded
+    as their chunk finishes, so they arrive out of order. Once ``until``
+    returns true for a pair no more chunks are started and iteration stops
+    after that pair.
+
+    With a ``cache`` (``intcode.memo.RunCache``) the jobs are looked up
+    first: cached results are yielded straight away and only the rest go
+    to the pool, their results being added to the cache.
+    """
+    if cache is not None:
+        yield from _run_cached(code, jobs, worker, until, processes, chunksize, cache)
+        return
+
+    processes = processes or os.cpu_count() or 1
+    chunks = _chunked(jobs, chunksize)
+    with ProcessPoolExecutor(
+        processes, initializer=_initialise, initargs=(code, worker)
+    ) as executor:
+        # Keep a couple of chunks queued per worker rather than submitting
+        # everything up front, which keeps early termination cheap.
+        pending: set[Future] = {
+            executor.submit(_run_chunk, chunk)
+            for chunk in itertools.islice(chunks, 2 * processes)
+        }
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for job, result in future.result():
+                        yield job, result
+                        if until is not None and until(job, result):
+                            return
+                    for chunk in itertools.islice(chunks, 1):
+                        pending.add(executor.submit(_run_chunk, chunk))
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _run_cached(
+    code: list[int],
+    jobs: Iterable[Any],
+    worker: Worker,
+    until: Optional[Callable[[Any, Any], bool]],
+    processes: Optional[int],
+    chunksize: int,
+    cache: RunCache,
+) -> Iterator[tuple[Any, Any]]:
+    from .memo import job_key, program_hash
+
+    program = program_hash(code)
+    misses = []
+    for job in jobs:
+        result = cache.get(job_key(program, job, worker))
+        if result is None:
+            misses.append(job)
+            continue
+        yield job, result
+        if until is not None and until(job, result):
+            return
+    if not misses:
+        return
+    for job, result in run_batch(
+        code,
+        misses,
+        worker=worker,
+        until=until,
+        processes=processes,
+        chunksize=chunksize,
+    ):
+        cache.put(job_key(program, job, worker), result)
+        yield job, result
@@ -0,0 +1,208 @@
+"""Benchmark the Intcode backends on the real puzzle programs.
+
+Run from the repository root::
+
+    python -m intcode.bench --output bench.jsonl
+
+Each line of output is a JSON record for one workload on one backend.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from .backends import BACKENDS
+from .processor import BaseProcessor, Status, load
+from .profiler import Profiler
+from .scheduler import Scheduler
+
+ROOT = Path(__file__).parent.parent
+
+Factory = Callable[[list[int]], BaseProcessor]
+
+REFERENCE = "reference"
+
+
+def run_to_halt(processor: BaseProcessor) -> list[int]:
+    while (status := processor.run_until_blocked()) is not Status.HALTED:
+        if status is Status.NEEDS_INPUT:
+            raise RuntimeError(f"Program waiting for input at {processor.i}")
+    return drain(processor)
+
+
+def drain(processor: BaseProcessor) -> list[int]:
+    outputs = []
+    while not processor.outputs.empty():
+        outputs.append(processor.outputs.get_nowait())
+    return outputs
+
+
+def boost(mode: int) -> Callable[[Factory, list[int]], list[int]]:
+    def workload(make: Factory, code: list[int]) -> list[int]:
+        processor = make(code)
+        processor.inputs.put_nowait(mode)
+        return run_to_halt(processor)
+
+    return workload
+
+
+def noun_verb_search(make: Factory, code: list[int]) -> list[int]:
+    for noun, verb in itertools.product(range(100), repeat=2):
+        processor = make(code)
+        processor[1], processor[2] = noun, verb
+        run_to_halt(processor)
+        if processor[0] == 19690720:
+            return [100 * noun + verb]
+    return []
+
+
+def feedback_loop(make: Factory, code: list[int]) -> list[int]:
+    signals = []
+    for phases in itertools.permutations(range(5, 10)):
+        processors = [make(code) for _ in phases]
+        for processor, following in zip(processors, processors[1:] + processors[:1]):
+            processor.outputs = following.inputs
+        for processor, phase in zip(processors, phases):
+            processor.inputs.put_nowait(phase)
+        processors[0].inputs.put_nowait(0)
+        scheduler = Scheduler()
+        scheduler.extend(processors)
+        scheduler.run()
+        signals.append(processors[0].inputs.get_nowait())
+    return [max(signals)]
+
+
+def arcade(make: Factory, code: list[int]) -> list[int]:
+    """Play the d13 game headless, keeping the paddle under the ball."""
+    processor = make(code)
+    processor[0] = 2
+    ball = paddle = score = 0
+    while True:
+        status = processor.run_until_blocked()
+        if status is Status.OUTPUT:
+            continue
+        while processor.outputs.qsize() >= 3:
+            x, y, tile = (processor.outputs.get_nowait() for _ in range(3))
+            if (x, y) == (-1, 0):
+                score = tile
+            elif tile == 4:
+                ball = x
+            elif tile == 3:
+                paddle = x
+        if status is Status.HALTED:
+            return [score]
+        processor.inputs.put_nowait((ball > paddle) - (ball < paddle))
+
+
+@dataclass(frozen=True)
+class Workload:
+    name: str
+    program: str
+    run: Callable[[Factory, list[int]], list[int]]
+
+
+WORKLOADS = [
+    Workload("d9-boost-test", "d9", boost(1)),
+    Workload("d9-boost", "d9", boost(2)),
+    Workload("d2-search", "d2", noun_verb_search),
+    Workload("d7-feedback", "d7", feedback_loop),
+    Workload("d13-game", "d13", arcade),
+]
+
+
+@dataclass
+class Measurement:
+    workload: str
+    backend: str
+    wall_seconds: float
+    instructions: int
+    instructions_per_second: float
+    peak_memory_bytes: int
+    matches_reference: bool
+    commit: Optional[str]
+    python: str
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(workload: Workload, backends: list[str], repeat: int = 3):
+    code = load(ROOT / workload.program / "input.txt")
+
+    # Instructions are counted once on the reference backend, with every
+    # processor the workload creates sharing one profiler.
+    profiler = Profiler()
+    reference = workload.run(
+        lambda code: BACKENDS[REFERENCE](code, profiler=profiler), code
+    )
+    commit = _commit()
+
+    for name in backends:
+        backend = BACKENDS[name]
+        wall = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            outputs = workload.run(backend, code)
+            wall = min(wall, time.perf_counter() - started)
+
+        tracemalloc.start()
+        workload.run(backend, code)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        yield Measurement(
+            workload.name,
+            name,
+            wall,
+            profiler.instructions,
+            profiler.instructions / wall,
+            peak,
+            outputs == reference,
+            commit,
+            platform.python_version(),
+        )
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", action="append", choices=sorted(BACKENDS))
+    parser.add_argument(
+        "--workload", action="append", choices=[w.name for w in WORKLOADS]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="append JSON lines here")
+    args = parser.parse_args(argv)
+
+    backends = args.backend or list(BACKENDS)
+    workloads = [w for w in WORKLOADS if not args.workload or w.name in args.workload]
+    output = args.output.open("a") if args.output else sys.stdout
+    try:
+        for workload in workloads:
+            for measurement in measure(workload, backends, args.repeat):
+                print(json.dumps(asdict(measurement)), file=output, flush=True)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+# Buffered values after which ``write`` wakes readers without waiting for
+# the producer to block, so a program that never asks for input still streams.
+FLUSH_SIZE = 4096
+
+
+class Channel:
+    """FIFO of Intcode values that hands them to readers in batches.
+
+    Values are appended to a ring buffer as soon as they are written, so
+    synchronous callers see them straight away with ``get_nowait``. Tasks
+    waiting for values are only woken on ``flush`` (or ``put_nowait``), which
+    processors do when they wait for input or halt: a screenful of output
+    costs one event loop switch rather than one per value, and readers take
+    it with ``get_many`` or ``get_until``.
+
+    The queue methods the days used (``get``, ``put``, ``get_nowait``,
+    ``put_nowait``, ``empty`` and ``qsize``) behave like ``asyncio.Queue``.
+
+    With a ``maxsize`` the channel is bounded: ``put`` waits for room,
+    ``put_nowait`` raises ``asyncio.QueueFull``, and a processor writing to
+    a full output channel is suspended (see ``BaseProcessor.run`` and
+    ``Scheduler``) until its reader catches up. Readers waiting for more
+    values than ``maxsize`` would never be served. ``high_water`` is the
+    most values ever buffered, and ``write_blocked_time`` and
+    ``read_blocked_time`` are the seconds writers spent waiting for room
+    and readers for values.
+    """
+
+    def __init__(self, maxsize: int = 0, flush_size: int = FLUSH_SIZE):
+        self.maxsize = maxsize
+        self.flush_size = min(flush_size, maxsize) if maxsize else flush_size
+        self._buffer: deque[int] = deque()
+        self._unflushed = 0
+        self._waiters: list[asyncio.Future] = []
+        self._writers: list[asyncio.Future] = []
+        self.high_water = 0
+        self.write_blocked_time = 0.0
+        self.read_blocked_time = 0.0
+
+    def qsize(self) -> int:
+        return len(self._buffer)
+
+    def empty(self) -> bool:
+        return not self._buffer
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= len(self._buffer)
+
+    def write(self, value: int) -> None:
+        """Buffer ``value`` without waking readers until the next flush.
+
+        Bounds aren't checked here; writers check ``full`` and wait for room.
+        """
+        buffer = self._buffer
+        buffer.append(value)
+        if len(buffer) > self.high_water:
+            self.high_water = len(buffer)
+        self._unflushed += 1
+        if self._unflushed >= self.flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Wake every task waiting for values."""
+        self._unflushed = 0
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def clear(self) -> None:
+        """Drop every buffered value, keeping the buffer and its waiters."""
+        self._buffer.clear()
+        self._unflushed = 0
+        self._taken()
+
+    def put_nowait(self, value: int) -> None:
+        if self.full():
+            raise asyncio.QueueFull
+        self.write(value)
+        self.flush()
+
+    async def put(self, value: int) -> None:
+        await self.wait_for_room()
+        self.put_nowait(value)
+
+    async def wait_for_room(self) -> None:
+        """Wait until the channel isn't full, counting the time blocked."""
+        if not self.full():
+            return
+        started = time.perf_counter()
+        while self.full():
+            writer = asyncio.get_running_loop().create_future()
+            self._writers.append(writer)
+            await writer
+        self.write_blocked_time += time.perf_counter() - started
+
+    def _taken(self) -> None:
+        """Wake writers waiting for room once values have been taken."""
+        if self._writers and not self.full():
+            writers, self._writers = self._writers, []
+            for writer in writers:
+                if not writer.done():
+                    writer.set_result(None)
+
+    def get_nowait(self) -> int:
+        if not self._buffer:
+            raise asyncio.QueueEmpty
+        value = self._buffer.popleft()
+        if self._writers:
+            self._taken()
+        return value
+
+    async def _wait(self, count: int) -> None:
+        if len(self._buffer) >= count:
+            return
+        started = time.perf_counter()
+        while len(self._buffer) < count:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+        self.read_blocked_time += time.perf_counter() - started
+
+    async def get(self) -> int:
+        await self._wait(1)
+        return self.get_nowait()
+
+    async def get_many(self, count: Optional[int] = None) -> list[int]:
+        """Take ``count`` values, or everything buffered once there is any."""
+        await self._wait(count or 1)
+        buffer = self._buffer
+        if count is None:
+            values = list(buffer)
+            buffer.clear()
+        else:
+            values = [buffer.popleft() for _ in range(count)]
+        self._taken()
+        return values
+
+    async def get_until(self, sentinel: int) -> list[int]:
+        """Take values up to and including the next ``sentinel``."""
+        values: list[int] = []
+        while True:
+            await self._wait(1)
+            buffer = self._buffer
+            while buffer:
+                values.append(value := buffer.popleft())
+                if value == sentinel:
+                    self._taken()
+                    return values
+            self._taken()
+
+    def __repr__(self) -> str:
+        return f"Channel({list(self._buffer)!r})"
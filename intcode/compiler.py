@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import functools
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Mapping, Optional
+
+from .loops import fast_forward
+from .memory import PAGE_BITS, PAGE_MASK, Memory
+from .processor import (
+    IMMEDIATE_MODE,
+    POSITION_MODE,
+    Instruction,
+    Processor,
+    Status,
+    decode,
+)
+from .symbolic import Unsupported
+
+# Instructions that never touch the queues and can be compiled into a block.
+ARITHMETIC = {
+    1: "{} + {}",
+    2: "{} * {}",
+    7: "1 if {} < {} else 0",
+    8: "1 if {} == {} else 0",
+}
+JUMPS = {5: "{} != 0", 6: "{} == 0"}
+ADJUST_RELATIVE_BASE = 9
+
+MAX_BLOCK_SIZE = 64
+# Times an address is reached on the interpreter before a block is compiled
+# there, so straight-line code that runs once (d2) never pays for it.
+HOT_THRESHOLD = 8
+
+Block = Callable[["CompiledProcessor", Memory, dict, Callable, Callable], None]
+
+
+@functools.lru_cache(maxsize=4096)
+def _build(source: str) -> Block:
+    """Compile block source, shared by every processor running the same code."""
+    namespace: dict = {}
+    exec(compile(source, "<intcode block>", "exec"), namespace)
+    return namespace["block"]
+
+
+def _read(instruction: Instruction, index: int, code: Memory) -> str:
+    _, param_mode, value = instruction.params[index]
+    if param_mode == IMMEDIATE_MODE:
+        return repr(value)
+    if param_mode == POSITION_MODE:
+        # Pages are never freed, so an allocated page can be indexed directly.
+        if value >> PAGE_BITS in code.pages:
+            return f"pages[{value >> PAGE_BITS}][{value & PAGE_MASK}]"
+        return f"get({value})"
+    return f"get(rb + {value})"
+
+
+def _fold(template: str, *operands: str) -> str:
+    expression = template.format(*operands)
+    if all(operand.lstrip("-").isdigit() for operand in operands):
+        return repr(eval(expression))
+    return expression
+
+
+def _exit(indent: str, address: str) -> list[str]:
+    return [
+        f"{indent}p.relative_base = rb",
+        f"{indent}p.i = {address}",
+        f"{indent}return",
+    ]
+
+
+@dataclass
+class CompiledProcessor(Processor):
+    """Processor that compiles straight-line code into Python functions.
+
+    Basic blocks of arithmetic, comparison, jump and relative base
+    instructions are turned into Python source with immediates folded in,
+    compiled once an address has been reached ``HOT_THRESHOLD`` times and
+    cached by start address. Input, output and halt are
+    left to the decoded interpreter. A write to memory covered by a block
+    drops the block so self-modifying programs are recompiled, and the
+    written cell is never compiled again: programs that patch their own
+    operands on every pass (d15 looks up its map that way) would otherwise
+    spend their time in the compiler.
+    """
+
+    _blocks: dict[int, Optional[Block]] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    _block_spans: dict[int, range] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    # Instructions in each block, for ``run_slice`` budgets.
+    _block_sizes: dict[int, int] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    # Address -> blocks whose instructions cover it. The sets are frozen so
+    # forks can copy these tables shallowly.
+    _block_cells: dict[int, frozenset[int]] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    # Address -> blocks that write it directly, skipping ``_store``.
+    _static_writes: dict[int, frozenset[int]] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    # Code cells that have been written at runtime, left to the interpreter.
+    _volatile: set[int] = field(init=False, repr=False, default_factory=set)
+    # Blocks that jump back to their own start, by start address, and the
+    # relative bases their loop couldn't be fast-forwarded at.
+    _loops: dict[int, tuple[list[tuple[int, Instruction]], set[int]]] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    # The loop being iterated, so it is only fast-forwarded on entry.
+    _looping: Optional[int] = field(init=False, repr=False, default=None)
+    # Instructions skipped by fast-forwarding loops.
+    skipped: int = field(init=False, default=0)
+    _heat: dict[int, int] = field(init=False, repr=False, default_factory=dict)
+
+    def __setitem__(self, index, value):
+        self._store(index, value)
+
+    def _store(self, index: int, value: int) -> bool:
+        """Write ``value`` and report whether compiled code was invalidated."""
+        stale = index in self._block_cells
+        if stale:
+            self._volatile.add(index)
+            for start in self._block_cells[index]:
+                self._drop_block(start)
+        super().__setitem__(index, value)
+        return stale
+
+    def _drop_block(self, start: int) -> None:
+        self._blocks.pop(start, None)
+        self._block_sizes.pop(start, None)
+        self._loops.pop(start, None)
+        for address in self._block_spans.pop(start, ()):
+            starts = self._block_cells.get(address, frozenset()) - {start}
+            if starts:
+                self._block_cells[address] = starts
+            else:
+                self._block_cells.pop(address, None)
+
+    def _cached_cells(self) -> Iterable[int]:
+        return (*super()._cached_cells(), *self._block_cells)
+
+    def _forget(self, index: int) -> None:
+        for start in self._block_cells.get(index, ()):
+            self._drop_block(start)
+        super()._forget(index)
+
+    def _drop_code(self, index: int) -> None:
+        covering = [
+            start for start, span in self._block_spans.items() if index in span
+        ]
+        for start in covering:
+            self._drop_block(start)
+        super()._drop_code(index)
+
+    def fork(self) -> CompiledProcessor:
+        child = super().fork()
+        child._blocks = dict(self._blocks)
+        child._block_spans = dict(self._block_spans)
+        child._block_sizes = dict(self._block_sizes)
+        child._loops = dict(self._loops)
+        child._block_cells = dict(self._block_cells)
+        child._static_writes = dict(self._static_writes)
+        child._volatile = set(self._volatile)
+        child._heat = dict(self._heat)
+        return child
+
+    def reset(self, patches: Optional[Mapping[int, int]] = None) -> None:
+        self._looping = None
+        super().reset(patches)
+
+    def _claim(self, cells: range) -> None:
+        """Mark ``cells`` as code, dropping blocks that write them blindly."""
+        for address in cells:
+            for start in self._static_writes.pop(address, ()):
+                self._drop_block(start)
+
+    def _decode(self, address: int) -> Instruction:
+        instruction = super()._decode(address)
+        self._claim(range(address, address + instruction.size))
+        return instruction
+
+    def _compile(self, start: int) -> Optional[Block]:
+        instructions: list[tuple[int, Instruction]] = []
+        address = start
+        while len(instructions) < MAX_BLOCK_SIZE:
+            try:
+                instruction = decode(self.__getitem__, address)
+            except KeyError:
+                break
+            op_code = instruction.op_code
+            if op_code not in ARITHMETIC and op_code not in JUMPS and (
+                op_code != ADJUST_RELATIVE_BASE
+            ):
+                break
+            if not self._volatile.isdisjoint(
+                range(address, address + instruction.size)
+            ):
+                break
+            instructions.append((address, instruction))
+            address += instruction.size
+            if op_code in JUMPS:
+                break
+
+        if not instructions:
+            self._blocks[start] = None
+            return None
+
+        end = address
+        span = range(start, end)
+        self._claim(span)
+        static_writes = set()
+        lines = ["def block(p, m, pages, get, store):", "    rb = p.relative_base"]
+        last = instructions[-1][1]
+        loop = (
+            last.op_code in JUMPS
+            and last.params[1][1:] == (IMMEDIATE_MODE, start)
+            and all(i.op_code != ADJUST_RELATIVE_BASE for _, i in instructions)
+        )
+        if loop:
+            self._loops[start] = (instructions, set())
+            lines.append(f"    if p._looping != {start}:")
+            lines.append(f"        p._looping = {start}")
+            lines.append(f"        p._fast_forward({start})")
+        for address, instruction in instructions:
+            op_code = instruction.op_code
+            following = address + instruction.size
+            if op_code in ARITHMETIC:
+                value = _fold(
+                    ARITHMETIC[op_code],
+                    _read(instruction, 0, self.code),
+                    _read(instruction, 1, self.code),
+                )
+                _, param_mode, target = instruction.params[2]
+                if (
+                    param_mode == POSITION_MODE
+                    and target not in span
+                    and target not in self._block_cells
+                    and target not in self._decoded_cells
+                ):
+                    lines.append(f"    m[{target}] = {value}")
+                    static_writes.add(target)
+                    continue
+                if param_mode == POSITION_MODE:
+                    lines.append(f"    if store({target}, {value}):")
+                else:
+                    lines.append(f"    if store(rb + {target}, {value}):")
+                lines.extend(_exit("        ", repr(following)))
+            elif op_code == ADJUST_RELATIVE_BASE:
+                lines.append(f"    rb += {_read(instruction, 0, self.code)}")
+            else:
+                condition = _fold(JUMPS[op_code], _read(instruction, 0, self.code))
+                lines.append(f"    if {condition}:")
+                lines.extend(_exit("        ", _read(instruction, 1, self.code)))
+        if loop:
+            lines.append("    p._looping = None")
+        lines.extend(_exit("    ", repr(end)))
+
+        block = self._blocks[start] = _build("\n".join(lines))
+        self._block_spans[start] = span
+        self._block_sizes[start] = len(instructions)
+        # Code the program map proves read-only can't invalidate the block.
+        if self.program is None or not self.program.read_only.issuperset(span):
+            for cell in span:
+                starts = self._block_cells.get(cell, frozenset())
+                self._block_cells[cell] = starts | {start}
+        for target in static_writes:
+            starts = self._static_writes.get(target, frozenset())
+            self._static_writes[target] = starts | {start}
+        return block
+
+    def run_until_blocked(self) -> Status:
+        # Blocks run many instructions per call, so profile on the interpreter.
+        if self.profiler is not None:
+            return self._run_profiled()[0]
+        blocks = self._blocks
+        code, get, store = self.code, self.__getitem__, self._store
+        pages = code.pages
+        while True:
+            i = self.i
+            try:
+                block = blocks[i]
+            except KeyError:
+                block = self._warm(i)
+            if block is None:
+                status = self.step()
+                if status is not None:
+                    return status
+            else:
+                block(self, code, pages, get, store)
+
+    def _fast_forward(self, start: int) -> None:
+        """Skip a loop ahead to its last iteration where that's provably safe."""
+        instructions, unsupported = self._loops.get(start, (None, None))
+        if instructions is None or self.relative_base in unsupported:
+            return
+        try:
+            iterations = fast_forward(
+                instructions, self.relative_base, self.__getitem__, self._store
+            )
+        except Unsupported:
+            unsupported.add(self.relative_base)
+            return
+        self.skipped += iterations * len(instructions)
+
+    def _warm(self, address: int) -> Optional[Block]:
+        """Count a visit to ``address`` and compile a block there once hot."""
+        count = self._heat[address] = self._heat.get(address, 0) + 1
+        return self._compile(address) if count >= HOT_THRESHOLD else None
+
+    def run_slice(self, budget: int) -> tuple[Status, int]:
+        # A block runs whole, so a slice can overshoot by one block.
+        if self.profiler is not None:
+            return self._run_profiled(budget)
+        blocks, sizes = self._blocks, self._block_sizes
+        code, get, store = self.code, self.__getitem__, self._store
+        pages = code.pages
+        executed = 0
+        while executed < budget:
+            i = self.i
+            try:
+                block = blocks[i]
+            except KeyError:
+                block = self._warm(i)
+            if block is None:
+                status = self.step()
+                if status is Status.HALTED or status is Status.NEEDS_INPUT:
+                    return status, executed
+                executed += 1
+                if status is Status.OUTPUT and self.outputs.full():
+                    return status, executed
+            else:
+                executed += sizes[i]
+                block(self, code, pages, get, store)
+        return Status.YIELDED, executed
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+from pathlib import Path
+from typing import Optional, Union
+
+# Written beside the source as e.g. ``input.txt.image``.
+SUFFIX = ".image"
+MAGIC = b"ICI1"
+# Magic, SHA-256 of the source, source size and mtime, number of cells.
+HEADER = struct.Struct("<4s32sQqQ")
+TYPECODE = "q"
+
+
+def parse(source: bytes) -> list[int]:
+    return [int(i) for i in source.split(b",")]
+
+
+def _stat(path: Path) -> tuple[int, int]:
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _read_image(image: Path, path: Path) -> Optional[list[int]]:
+    """Return the cells in ``image`` if it is still valid for ``path``."""
+    try:
+        with image.open("rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped:
+            magic, digest, size, mtime, count = HEADER.unpack_from(mapped)
+            if magic != MAGIC or len(mapped) != HEADER.size + 8 * count:
+                return None
+            if (size, mtime) != _stat(path):
+                # Touched (say by a checkout) but maybe not changed.
+                if hashlib.sha256(path.read_bytes()).digest() != digest:
+                    return None
+                _write_image(image, path, digest, None)
+            with memoryview(mapped)[HEADER.size :] as cells:
+                with cells.cast(TYPECODE) as values:
+                    return values.tolist()
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def _write_image(
+    image: Path, path: Path, digest: bytes, code: Optional[list[int]]
+) -> None:
+    if code is None:
+        with image.open("rb") as f:
+            cells = f.read()[HEADER.size :]
+    else:
+        cells = array(TYPECODE, code).tobytes()
+    header = HEADER.pack(MAGIC, digest, *_stat(path), len(cells) // 8)
+    partial = image.with_name(f"{image.name}.{os.getpid()}")
+    partial.write_bytes(header + cells)
+    os.replace(partial, image)
+
+
+def load(path: Union[str, Path]) -> list[int]:
+    """Read a comma separated program, through a binary image cache.
+
+    The parsed program is kept as packed 64-bit cells in ``<path>.image``
+    together with a hash of the source, and memory mapped on later loads so
+    they skip parsing. The image is rebuilt when the source changes; a
+    program that doesn't fit in 64 bits, or a directory that can't be
+    written, just isn't cached.
+    """
+    path = Path(path)
+    image = path.with_name(path.name + SUFFIX)
+    code = _read_image(image, path)
+    if code is not None:
+        return code
+
+    source = path.read_bytes()
+    code = parse(source)
+    try:
+        _write_image(image, path, hashlib.sha256(source).digest(), code)
+    except (OSError, OverflowError):
+        pass
+    return code
@@ -0,0 +1,177 @@
+"""Fast-forward simple counting loops instead of stepping through them.
+
+A candidate loop is a straight-line run of arithmetic and comparisons
+ending in a conditional jump back to its start, as the compiler finds them.
+One iteration is run symbolically, with memory cells as unknowns. The loop
+is skipped ahead only when every cell it writes either
+
+* grows by the same amount every iteration (``i += 1``, ``acc += step``
+  with ``step`` never written in the loop), or
+* is a temporary written before it is read in each iteration,
+
+and the exit test is affine in the iteration count. Anything else raises
+``Unsupported`` and the loop runs normally.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Optional, Union
+
+from .processor import IMMEDIATE_MODE, POSITION_MODE, Instruction
+from .symbolic import Polynomial, Unsupported
+
+# Skipping fewer iterations than this isn't worth the analysis.
+MIN_ITERATIONS = 4
+
+ITERATION = "t"
+
+
+@dataclass(frozen=True)
+class Comparison:
+    """The 0/1 result of a less-than or equals instruction."""
+
+    op_code: int
+    difference: Polynomial  # left - right
+
+
+Value = Union[Polynomial, Comparison]
+
+
+def _name(address: int) -> str:
+    return f"m{address}"
+
+
+def _substitute(
+    polynomial: Polynomial, values: dict[str, Polynomial]
+) -> Polynomial:
+    result = Polynomial.constant(0)
+    for monomial, coefficient in polynomial.terms.items():
+        term = Polynomial.constant(coefficient)
+        for name in monomial:
+            term = term * values[name]
+        result = result + term
+    return result
+
+
+def _first_exit(
+    op_code: int, condition: Value, values: dict[str, Polynomial]
+) -> Optional[int]:
+    """The first iteration whose jump back isn't taken, None if there's none."""
+    if isinstance(condition, Comparison):
+        h = _substitute(condition.difference, values)
+        # Jump if true (5) keeps looping while the comparison holds.
+        holds = op_code == 5
+        less_than = condition.op_code == 7
+    else:
+        h = _substitute(condition, values)
+        # A plain value loops while it's non-zero for 5, zero for 6.
+        holds, less_than = op_code == 6, False
+    if not h.is_affine() or any(m not in ((), (ITERATION,)) for m in h.terms):
+        raise Unsupported(condition)
+    a, b = h.coefficient(()), h.coefficient((ITERATION,))
+
+    if less_than and holds:
+        # Loops while a + b*t < 0.
+        if a >= 0:
+            return 0
+        return (-a + b - 1) // b if b > 0 else None
+    if less_than:
+        # Loops while a + b*t >= 0.
+        if a < 0:
+            return 0
+        return a // -b + 1 if b < 0 else None
+    if holds:
+        # Loops while a + b*t == 0.
+        if a != 0:
+            return 0
+        return 1 if b != 0 else None
+    # Loops while a + b*t != 0.
+    if b == 0:
+        return 0 if a == 0 else None
+    return -a // b if -a % b == 0 and -a // b >= 0 else None
+
+
+def fast_forward(
+    instructions: list[tuple[int, Instruction]],
+    relative_base: int,
+    read: Callable[[int], int],
+    write: Callable[[int, int], None],
+) -> int:
+    """Skip all but the last iteration of the loop, returning how many.
+
+    ``instructions`` is the loop body, ending with the jump back. Memory is
+    read and written through the callbacks; on return the caller runs the
+    final iteration itself, so its exit behaves exactly as normal.
+    """
+    *body, (jump_address, jump) = instructions
+    start = body[0][0] if body else jump_address
+    span = range(start, jump_address + jump.size)
+
+    written: dict[int, Value] = {}
+    live_in: set[int] = set()
+
+    def address(mode: int, value: int) -> int:
+        return value if mode == POSITION_MODE else relative_base + value
+
+    def load(mode: int, value: int) -> Value:
+        if mode == IMMEDIATE_MODE:
+            return Polynomial.constant(value)
+        cell = address(mode, value)
+        if cell in written:
+            return written[cell]
+        live_in.add(cell)
+        return Polynomial.symbol(_name(cell))
+
+    def arithmetic(value: Value) -> Polynomial:
+        if isinstance(value, Comparison):
+            raise Unsupported(value)
+        return value
+
+    for _, instruction in body:
+        (_, a_mode, a), (_, b_mode, b), (_, out_mode, out) = instruction.params
+        left, right = load(a_mode, a), load(b_mode, b)
+        if instruction.op_code == 1:
+            value = arithmetic(left) + arithmetic(right)
+        elif instruction.op_code == 2:
+            value = arithmetic(left) * arithmetic(right)
+        else:
+            difference = arithmetic(left) + arithmetic(right) * (
+                Polynomial.constant(-1)
+            )
+            value = Comparison(instruction.op_code, difference)
+        target = address(out_mode, out)
+        if target in span:
+            raise Unsupported(target)
+        written[target] = value
+
+    (_, test_mode, test), _ = jump.params
+    if test_mode == IMMEDIATE_MODE:
+        raise Unsupported(test)
+    condition = load(test_mode, test)
+
+    # Cells read but never written keep their value for the whole loop.
+    values = {
+        _name(cell): Polynomial.constant(read(cell))
+        for cell in live_in
+        if cell not in written
+    }
+    # The rest must be induction variables, moving by a loop invariant step.
+    steps: dict[int, int] = {}
+    for cell in live_in & written.keys():
+        step = arithmetic(written[cell]) + Polynomial.symbol(_name(cell)) * (
+            Polynomial.constant(-1)
+        )
+        if any(name not in values for monomial in step.terms for name in monomial):
+            raise Unsupported(cell)
+        steps[cell] = _substitute(step, values).coefficient(())
+    for cell, step in steps.items():
+        values[_name(cell)] = Polynomial.constant(read(cell)) + Polynomial.constant(
+            step
+        ) * Polynomial.symbol(ITERATION)
+
+    last = _first_exit(jump.op_code, condition, values)
+    if last is None or last < MIN_ITERATIONS:
+        return 0
+    for cell, step in steps.items():
+        write(cell, read(cell) + last * step)
+    return last
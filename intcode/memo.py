@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from .batch import Job, Result, Worker, run_job
+
+# Bumped when ``Result`` or the key layout changes, to orphan old disk entries.
+VERSION = 1
+
+
+def program_hash(code: list[int]) -> str:
+    return hashlib.sha256(",".join(map(str, code)).encode()).hexdigest()
+
+
+def job_key(program: str, job: Job, worker: Worker = run_job) -> str:
+    """Cache key for ``worker(code, job)``, ``program`` being the code's hash."""
+    parts = (
+        VERSION,
+        program,
+        f"{worker.__module__}.{worker.__qualname__}",
+        sorted(job.patches.items()),
+        tuple(job.inputs),
+        tuple(job.read),
+    )
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+class RunCache:
+    """Results of non-interactive runs, in memory and optionally on disk.
+
+    The memory tier keeps the ``maxsize`` most recently used results. With a
+    ``directory`` every result is also pickled there, so later processes
+    and re-runs are served without running anything; disk hits are promoted
+    to memory.
+    """
+
+    def __init__(
+        self, maxsize: int = 4096, directory: Union[str, Path, None] = None
+    ):
+        self.maxsize = maxsize
+        self.directory = Path(directory) if directory is not None else None
+        self._memory: OrderedDict[str, Any] = OrderedDict()
+        self.hits = self.disk_hits = self.misses = 0
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.pickle"
+
+    def get(self, key: str) -> Optional[Any]:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+        if self.directory is not None:
+            try:
+                with self._path(key).open("rb") as f:
+                    result = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+            else:
+                self.disk_hits += 1
+                self._remember(key, result)
+                return result
+        self.misses += 1
+        return None
+
+    def put(self, key: str, result: Any) -> None:
+        self._remember(key, result)
+        if self.directory is not None:
+            path = self._path(key)
+            path.parent.mkdir(exist_ok=True)
+            partial = path.with_name(f"{path.name}.{os.getpid()}")
+            with partial.open("wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(partial, path)
+
+    def _remember(self, key: str, result: Any) -> None:
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def run(self, code: list[int], job: Job, worker: Worker = run_job) -> Result:
+        """``worker(code, job)``, served from the cache when it has been run."""
+        key = job_key(program_hash(code), job, worker)
+        result = self.get(key)
+        if result is None:
+            result = worker(code, job)
+            self.put(key, result)
+        return result
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from array import array
+from typing import Iterable, Mapping, Union
+
+Page = Union[array, list[int], tuple[int, ...]]
+
+PAGE_BITS = 10
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
+# Shared by every page that has never been written, so reads are free.
+ZERO_PAGE: tuple[int, ...] = (0,) * PAGE_SIZE
+
+# Signed 64-bit cells; pages holding anything wider fall back to lists.
+TYPECODE = "q"
+_ZERO_BYTES = bytes(array(TYPECODE).itemsize * PAGE_SIZE)
+_ZERO_ARRAY = array(TYPECODE, _ZERO_BYTES)
+
+
+def _page(cells: Iterable[int]) -> Page:
+    """Pack ``cells`` into a typed page, or a list if any cell is too big."""
+    try:
+        return array(TYPECODE, cells)
+    except OverflowError:
+        return list(cells)
+
+
+class Memory:
+    """Sparse Intcode memory made of fixed-size pages allocated on write.
+
+    Addresses that were never written read as zero from ``ZERO_PAGE``, so
+    the footprint follows the addresses a program touches rather than the
+    highest one.
+
+    Pages are ``array('q')`` so copying one is a memcpy and cells aren't
+    boxed ints. Writing a value outside 64 bits turns that page into a list
+    of Python ints (d9 BOOST works with big numbers on purpose), so reads
+    and writes behave the same whichever representation a page has.
+
+    Pages can be shared with forks and snapshots. Only pages in ``owned``
+    are written in place; any other page is copied on its first write.
+    ``allocations`` counts pages that had to be created for a write.
+    """
+
+    def __init__(self, code: Iterable[int] = ()):
+        self.pages: dict[int, Page] = {}
+        self.owned: set[int] = set()
+        self.allocations = 0
+        code = list(code)
+        for start in range(0, len(code), PAGE_SIZE):
+            cells = code[start : start + PAGE_SIZE]
+            cells += ZERO_PAGE[len(cells) :]
+            self.pages[start >> PAGE_BITS] = _page(cells)
+            self.owned.add(start >> PAGE_BITS)
+
+    def __getitem__(self, index: int) -> int:
+        return self.pages.get(index >> PAGE_BITS, ZERO_PAGE)[index & PAGE_MASK]
+
+    def __setitem__(self, index: int, value: int) -> None:
+        number = index >> PAGE_BITS
+        page = self.pages[number] if number in self.owned else self._own(number)
+        try:
+            page[index & PAGE_MASK] = value
+        except OverflowError:
+            page = self.pages[number] = list(page)
+            page[index & PAGE_MASK] = value
+
+    def _own(self, number: int) -> Page:
+        page = self.pages.get(number, ZERO_PAGE)
+        if page is ZERO_PAGE:
+            self.allocations += 1
+            page = array(TYPECODE, _ZERO_BYTES)
+        else:
+            page = page[:]
+        self.pages[number] = page
+        self.owned.add(number)
+        return page
+
+    def fork(self) -> Memory:
+        """Return a copy that shares every page with this memory until written."""
+        child = Memory()
+        child.pages.update(self.pages)
+        self.owned.clear()
+        return child
+
+    def snapshot(self) -> Mapping[int, Page]:
+        """Freeze the current pages; they are copied before the next write."""
+        self.owned.clear()
+        return dict(self.pages)
+
+    def restore(self, snapshot: Mapping[int, Page]) -> None:
+        # Pages allocated since the snapshot are zeroed rather than removed,
+        # compiled code indexes known pages without a lookup default.
+        for number in self.pages.keys() - snapshot.keys():
+            self.pages[number] = ZERO_PAGE
+        self.pages.update(snapshot)
+        self.owned.clear()
+
+    def reset(self, template: Mapping[int, Page]) -> None:
+        """Make memory equal ``template`` again, a snapshot taken from it.
+
+        Pages written since are copied back over in place and stay owned, so
+        running again doesn't allocate them anew; any other page is pointed
+        back at the template's.
+        """
+        pages = self.pages
+        for number, page in pages.items():
+            original = template.get(number, ZERO_PAGE)
+            if number not in self.owned:
+                if page is not original:
+                    pages[number] = original
+            elif type(page) is not array:
+                pages[number] = _page(original)
+            elif original is ZERO_PAGE:
+                page[:] = _ZERO_ARRAY
+            elif type(original) is array:
+                page[:] = original
+            else:
+                pages[number] = list(original)
+
+    def __repr__(self) -> str:
+        return f"Memory(pages={sorted(self.pages)})"
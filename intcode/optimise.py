@@ -0,0 +1,260 @@
+"""Rewrite Intcode programs into smaller equivalent programs.
+
+Show what the pass does to a program, optionally saving the result, with::
+
+    python -m intcode.optimise d15/input.txt -o d15/optimised.txt
+
+Within each basic block, values known before the program runs (immediates,
+cells nothing writes, cells set earlier in the block) are folded into the
+instructions reading them. Instructions left with nothing to do, such as
+``add x, 0 -> x``, a write of the value already there or a jump that never
+fires, are removed and the rest of their run slid up behind a jump over the
+freed cells. Only instructions whose cells the analysis proves are never
+written, and never read as data, are rewritten, so a program whose map is
+incomplete, uses relative mode or rewrites where it writes or jumps comes
+back unchanged. Reads through an address the program computes itself are
+taken to be of data. Apply patches such as a day's noun and verb before
+optimising, since they change what is constant.
+"""
+from __future__ import annotations
+
+import argparse
+import operator
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from .analysis import ProgramMap, analyse
+from .processor import (
+    HALT,
+    IMMEDIATE_MODE,
+    POSITION_MODE,
+    RELATIVE_MODE,
+    Instruction,
+    ParamType,
+    load,
+    raw_op_code,
+)
+
+ARITHMETIC: dict[int, Callable[[int, int], int]] = {
+    1: operator.add,
+    2: operator.mul,
+    7: lambda a, b: int(a < b),
+    8: lambda a, b: int(a == b),
+}
+# Adding 0 or multiplying by 1 copies the other operand.
+IDENTITY = {1: 0, 2: 1}
+JUMP_SIZE = 3
+
+
+@dataclass(frozen=True)
+class Optimised:
+    code: list[int]
+    # Instructions no longer run, net of the jumps added over freed cells.
+    removed: int
+    # Instructions rewritten to read fewer cells.
+    folded: int
+
+
+def _cells(address: int, instruction: Instruction) -> range:
+    return range(address, address + instruction.size)
+
+
+def _encode(op_code: int, operands: list[tuple[int, int]]) -> list[int]:
+    modes = [mode for mode, _ in operands]
+    return [raw_op_code(op_code, modes), *(value for _, value in operands)]
+
+
+def _jump(target: int) -> list[int]:
+    return _encode(5, [(IMMEDIATE_MODE, 1), (IMMEDIATE_MODE, target)])
+
+
+def _is_terminal(cells: list[int]) -> bool:
+    """Whether control never falls through ``cells``."""
+    if cells[0] == HALT:
+        return True
+    return len(cells) == JUMP_SIZE and cells == _jump(cells[2])
+
+
+class _Block:
+    """Folds the instructions of one basic block in order."""
+
+    def __init__(self, code: list[int], program: ProgramMap):
+        self.code = code
+        self.written = program.written
+        # Values cells are known to hold at this point in the block.
+        self.known: dict[int, int] = {}
+
+    def value(self, mode: int, value: int) -> Optional[int]:
+        if mode == IMMEDIATE_MODE:
+            return value
+        if value in self.known:
+            return self.known[value]
+        if value >= 0 and value not in self.written:
+            return self.code[value] if value < len(self.code) else 0
+        return None
+
+    def operands(self, instruction: Instruction) -> list[tuple[int, int]]:
+        """The parameters, with inputs of known value made immediate."""
+        operands = []
+        for param_type, mode, value in instruction.params:
+            known = self.value(mode, value)
+            if param_type == ParamType.INPUT and known is not None:
+                mode, value = IMMEDIATE_MODE, known
+            operands.append((mode, value))
+        return operands
+
+    def fold(self, instruction: Instruction) -> Optional[list[int]]:
+        """The cells to run in place of ``instruction``, None for nothing."""
+        op_code = instruction.op_code
+        if op_code in ARITHMETIC:
+            return self._arithmetic(instruction)
+        if op_code in (5, 6):
+            (_, test_mode, test), (_, target_mode, target) = instruction.params
+            condition = self.value(test_mode, test)
+            if condition is not None:
+                if bool(condition) != (op_code == 5):
+                    return None
+                destination = self.value(target_mode, target)
+                if destination is not None:
+                    return _jump(destination)
+        elif op_code == 3:
+            self.known.pop(instruction.params[0][2], None)
+        return _encode(op_code, self.operands(instruction))
+
+    def _arithmetic(self, instruction: Instruction) -> Optional[list[int]]:
+        op_code = instruction.op_code
+        (_, a_mode, a), (_, b_mode, b), (_, _, out) = instruction.params
+        left, right = self.value(a_mode, a), self.value(b_mode, b)
+        if left is not None and right is not None:
+            result: Optional[int] = ARITHMETIC[op_code](left, right)
+        elif op_code == 2 and 0 in (left, right):
+            result = 0
+        elif op_code in (7, 8) and a_mode == b_mode == POSITION_MODE and a == b:
+            result = int(op_code == 8)
+        else:
+            result = None
+
+        if result is not None:
+            if self.known.get(out) == result:
+                return None
+            self.known[out] = result
+            return _encode(
+                1, [(IMMEDIATE_MODE, result), (IMMEDIATE_MODE, 0), (POSITION_MODE, out)]
+            )
+
+        self.known.pop(out, None)
+        if op_code in IDENTITY:
+            for (mode, source), other in (((a_mode, a), right), ((b_mode, b), left)):
+                if other != IDENTITY[op_code]:
+                    continue
+                if source == out:
+                    return None
+                # A move, in one canonical form.
+                return _encode(
+                    1, [(mode, source), (IMMEDIATE_MODE, 0), (POSITION_MODE, out)]
+                )
+        return _encode(op_code, self.operands(instruction))
+
+
+def _place(
+    result: list[int], start: int, end: int, run: list[Optional[list[int]]]
+) -> Optional[int]:
+    """Slide the kept instructions of a run up, returning how many
+    instructions that saves, or None when it doesn't fit or pay."""
+    kept = [cells for cells in run if cells is not None]
+    terminal = bool(kept) and _is_terminal(kept[-1])
+    tail = [] if terminal else _jump(end)
+    saved = len(run) - len(kept) - (0 if terminal else 1)
+    layout = [cell for cells in kept for cell in cells] + tail
+    if saved <= 0 or len(layout) > end - start:
+        return None
+    result[start:end] = layout + [0] * (end - start - len(layout))
+    return saved
+
+
+def optimise(code: list[int]) -> Optimised:
+    program = analyse(code)
+    if not program.read_only or any(
+        mode == RELATIVE_MODE
+        for instruction in program.instructions.values()
+        for _, mode, _ in instruction.params
+    ):
+        return Optimised(list(code), 0, 0)
+
+    # Cells read as data, which must keep their values.
+    read = {
+        value
+        for instruction in program.instructions.values()
+        for param_type, mode, value in instruction.params
+        if param_type == ParamType.INPUT and mode == POSITION_MODE
+    }
+    rewritable = {
+        address
+        for address, instruction in program.instructions.items()
+        if all(
+            cell in program.read_only and cell not in read
+            for cell in _cells(address, instruction)
+        )
+    }
+
+    result = list(code)
+    removed = folded = 0
+
+    def flush(run: list[tuple[int, Instruction, Optional[list[int]]]]) -> None:
+        nonlocal removed, folded
+        if not run:
+            return
+        start = run[0][0]
+        end = run[-1][0] + run[-1][1].size
+        saved = _place(result, start, end, [cells for _, _, cells in run])
+        if saved is not None:
+            removed += saved
+        for address, instruction, cells in run:
+            if cells is None:
+                continue
+            if saved is None:
+                result[address : address + instruction.size] = cells
+            if cells != code[address : address + instruction.size]:
+                folded += 1
+        run.clear()
+
+    for block in program.blocks.values():
+        folding = _Block(code, program)
+        run: list[tuple[int, Instruction, Optional[list[int]]]] = []
+        address = block.start
+        while address < block.end:
+            instruction = program.instructions[address]
+            if address in rewritable:
+                run.append((address, instruction, folding.fold(instruction)))
+            elif any(cell in program.written for cell in _cells(address, instruction)):
+                # It may not run as decoded, so nothing is known after it.
+                folding.known.clear()
+                flush(run)
+            else:
+                folding.fold(instruction)
+                flush(run)
+            address += instruction.size
+        flush(run)
+
+    while len(result) > 1 and result[-1] == 0:
+        result.pop()
+    return Optimised(result, removed, folded)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Optimise an Intcode program.")
+    parser.add_argument("program")
+    parser.add_argument("-o", "--output", help="write the optimised program here")
+    args = parser.parse_args(argv)
+
+    code = load(args.program)
+    optimised = optimise(code)
+    print(f"removed {optimised.removed} instructions, folded {optimised.folded}")
+    print(f"size {len(code)} -> {len(optimised.code)}")
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(",".join(map(str, optimised.code)) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import itertools
+import time
+from dataclasses import dataclass, field
+from enum import Enum, auto
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Iterable,
+    Literal,
+    Mapping,
+    Optional,
+)
+
+from .channel import Channel
+from .image import load
+from .memory import PAGE_BITS, PAGE_MASK, ZERO_PAGE, Memory, Page
+from .profiler import Profiler
+
+if TYPE_CHECKING:
+    from .analysis import ProgramMap
+    from .trace import Recorder
+
+HALT = 99
+
+
+POSITION_MODE = 0
+IMMEDIATE_MODE = 1
+RELATIVE_MODE = 2
+
+ParamMode = Literal[POSITION_MODE, IMMEDIATE_MODE, RELATIVE_MODE]
+OpCode = int
+
+# The longest instruction is an opcode followed by three parameters.
+MAX_INSTRUCTION_SIZE = 4
+
+
+class ParamType(Enum):
+    INPUT = auto()
+    OUTPUT = auto()
+
+
+class Status(Enum):
+    """Why ``run_until_blocked`` handed control back to the caller."""
+
+    HALTED = auto()
+    NEEDS_INPUT = auto()
+    OUTPUT = auto()
+    # Only from ``run_slice``: the instruction budget ran out.
+    YIELDED = auto()
+
+
+def parse_op_code(raw_op_code: int,) -> tuple[OpCode, list[ParamMode]]:
+    str_op_code = f"{raw_op_code:05}"
+    return (
+        int(str_op_code[3:]),
+        [int(str_op_code[2]), int(str_op_code[1]), int(str_op_code[0])],
+    )
+
+
+SPEC: dict[OpCode, tuple[Callable, list[ParamType]]] = {}
+
+
+@dataclass(frozen=True)
+class Operation:
+    """A raw opcode value such as ``1001``, with operand fetching built in.
+
+    ``execute(p, *args)`` advances ``p.i``, fetches the operands straight
+    from the raw parameter values ``args`` and calls the handler;
+    ``fetch(p, *args)`` only fetches them.
+    """
+
+    op_code: OpCode
+    handler: Optional[Callable]
+    params: tuple[tuple[ParamType, ParamMode], ...]
+    execute: Callable
+    fetch: Optional[Callable]
+
+    @property
+    def size(self) -> int:
+        return len(self.params) + 1
+
+
+def _halt(p):
+    p.halted = True
+    return Status.HALTED
+
+
+# Raw opcode value -> operation, filled in by ``handler`` for every valid
+# combination of parameter modes.
+DISPATCH: dict[int, Operation] = {HALT: Operation(HALT, None, (), _halt, None)}
+
+MODES = {
+    ParamType.INPUT: (POSITION_MODE, IMMEDIATE_MODE, RELATIVE_MODE),
+    ParamType.OUTPUT: (POSITION_MODE, RELATIVE_MODE),
+}
+OPERANDS = {
+    (ParamType.INPUT, POSITION_MODE): "p.code[{}]",
+    (ParamType.INPUT, IMMEDIATE_MODE): "{}",
+    (ParamType.INPUT, RELATIVE_MODE): "p.code[p.relative_base + {}]",
+    (ParamType.OUTPUT, POSITION_MODE): "{}",
+    (ParamType.OUTPUT, RELATIVE_MODE): "p.relative_base + {}",
+}
+
+
+def raw_op_code(op_code: OpCode, param_modes: Iterable[ParamMode]) -> int:
+    return op_code + sum(
+        mode * 10 ** digit for digit, mode in enumerate(param_modes, start=2)
+    )
+
+
+def specialise(
+    op_code: OpCode,
+    fn: Callable,
+    param_types: list[ParamType],
+    param_modes: Iterable[ParamMode],
+) -> Operation:
+    """Generate the operation for ``fn`` with its parameters in ``param_modes``."""
+    params = tuple(zip(param_types, param_modes))
+    names = [f"a{n}" for n in range(len(params))]
+    operands = ", ".join(
+        OPERANDS[param].format(name) for param, name in zip(params, names)
+    )
+    signature = ", ".join(["p", *names])
+    source = "\n".join(
+        [
+            f"def execute({signature}):",
+            f"    p.i += {len(params) + 1}",
+            f"    return handler(p, {operands})",
+            f"def fetch({signature}):",
+            f"    return ({operands},)",
+        ]
+    )
+    namespace = {"handler": fn}
+    name = f"<intcode {raw_op_code(op_code, param_modes)}>"
+    exec(compile(source, name, "exec"), namespace)
+    return Operation(op_code, fn, params, namespace["execute"], namespace["fetch"])
+
+
+def handler(op_code: OpCode, params: list[ParamType]):
+    def wrapper(fn):
+        SPEC[op_code] = (fn, params)
+        for param_modes in itertools.product(*(MODES[param] for param in params)):
+            DISPATCH[raw_op_code(op_code, param_modes)] = specialise(
+                op_code, fn, params, param_modes
+            )
+        return fn
+
+    return wrapper
+
+
+def dispatch(raw: int) -> Operation:
+    """Look up the operation for ``raw``, falling back to parsing it.
+
+    The fallback covers values the table leaves out, such as mode digits
+    for parameters the instruction doesn't have, and adds them to the table
+    so each is only specialised once.
+    """
+    try:
+        return DISPATCH[raw]
+    except KeyError:
+        op_code, param_modes = parse_op_code(raw)
+        if op_code == HALT:
+            operation = DISPATCH[HALT]
+        else:
+            fn, param_types = SPEC[op_code]
+            operation = specialise(
+                op_code, fn, param_types, param_modes[: len(param_types)]
+            )
+        DISPATCH[raw] = operation
+        return operation
+
+
+@dataclass(frozen=True)
+class Instruction:
+    """An instruction decoded once from memory and replayed from the cache."""
+
+    op_code: OpCode
+    handler: Optional[Callable]
+    params: tuple[tuple[ParamType, ParamMode, int], ...]
+    size: int
+    execute: Callable
+    fetch: Optional[Callable]
+    # The raw parameter values, as ``execute`` and ``fetch`` take them.
+    args: tuple[int, ...]
+
+
+def decode(code: Callable[[int], int], address: int) -> Instruction:
+    operation = dispatch(code(address))
+    args = tuple(code(address + offset) for offset in range(1, operation.size))
+    params = tuple(
+        (param_type, param_mode, value)
+        for (param_type, param_mode), value in zip(operation.params, args)
+    )
+    return Instruction(
+        operation.op_code,
+        operation.handler,
+        params,
+        operation.size,
+        operation.execute,
+        operation.fetch,
+        args,
+    )
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Saved VM state; its pages are shared copy-on-write with the VM."""
+
+    pages: Mapping[int, Page]
+    i: int
+    relative_base: int
+    halted: bool
+
+
+@dataclass
+class BaseProcessor:
+    code: Memory
+    inputs: Channel = field(default_factory=Channel)
+    outputs: Channel = field(default_factory=Channel)
+
+    started: asyncio.locks.Event = field(default_factory=asyncio.locks.Event)
+    suspended: asyncio.locks.Event = field(default_factory=asyncio.locks.Event)
+
+    halted: bool = False
+
+    profiler: Optional[Profiler] = None
+    recorder: Optional[Recorder] = None
+    # Static analysis of the loaded program, see ``intcode.analysis``. Code
+    # it proves read-only isn't watched for writes, so memory must only be
+    # patched from outside before the program runs.
+    program: Optional[ProgramMap] = None
+
+    i: int = field(init=False, default=0)
+    relative_base: int = field(init=False, default=0)
+
+    _decoded: dict[int, Instruction] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    # Every address covered by a cached instruction, used to spot writes to
+    # decoded code. Stale entries only cost a scan in ``_invalidate``.
+    _decoded_cells: set[int] = field(init=False, repr=False, default_factory=set)
+    # The memory as loaded, frozen for ``reset``.
+    _template: Mapping[int, Page] = field(init=False, repr=False, default=None)
+    # Cells written by ``reset`` patches, which may be code the program map
+    # calls read-only and so isn't watched.
+    _patched: set[int] = field(init=False, repr=False, default_factory=set)
+
+    def __post_init__(self):
+        if not isinstance(self.code, Memory):
+            self.code = Memory(self.code)
+        self._template = self.code.snapshot()
+        if self.recorder is not None:
+            self.recorder.checkpoint(self)
+
+    def __setitem__(self, index, value):
+        if index in self._decoded_cells:
+            self._invalidate(index)
+        self.code[index] = value
+
+    def __getitem__(self, index):
+        return self.code[index]
+
+    def _invalidate(self, index: int) -> None:
+        """Drop every cached instruction that covers ``index``."""
+        for start in range(index - MAX_INSTRUCTION_SIZE + 1, index + 1):
+            instruction = self._decoded.get(start)
+            if instruction is not None and start + instruction.size > index:
+                del self._decoded[start]
+        self._decoded_cells.discard(index)
+
+    def _cached_cells(self) -> Iterable[int]:
+        return tuple(self._decoded_cells)
+
+    def _forget(self, index: int) -> None:
+        """Drop cached code covering ``index`` after memory changed under it."""
+        self._invalidate(index)
+
+    def _drop_code(self, index: int) -> None:
+        """Drop cached code covering ``index``, even code that isn't watched."""
+        self._invalidate(index)
+
+    def _reconcile(self, previous: Mapping[int, Page]) -> None:
+        """Drop cached code whose cells differ from the ``previous`` pages."""
+        pages = self.code.pages
+        for index in self._cached_cells():
+            number = index >> PAGE_BITS
+            old = previous.get(number, ZERO_PAGE)
+            new = pages.get(number, ZERO_PAGE)
+            if old is not new and old[index & PAGE_MASK] != new[index & PAGE_MASK]:
+                self._forget(index)
+
+    def fork(self) -> BaseProcessor:
+        """Return an independent VM that shares memory pages copy-on-write.
+
+        The fork carries over the decoded code and execution state but starts
+        with empty queues of its own and isn't recorded.
+        """
+        child = copy.copy(self)
+        child.code = self.code.fork()
+        child.inputs, child.outputs = Channel(), Channel()
+        child.started, child.suspended = asyncio.Event(), asyncio.Event()
+        child.recorder = None
+        child._decoded = dict(self._decoded)
+        child._decoded_cells = set(self._decoded_cells)
+        child._patched = set(self._patched)
+        return child
+
+    def snapshot(self) -> Snapshot:
+        return Snapshot(self.code.snapshot(), self.i, self.relative_base, self.halted)
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """Roll memory and registers back to ``snapshot``; queues are kept."""
+        previous = dict(self.code.pages)
+        self.code.restore(snapshot.pages)
+        self._reconcile(previous)
+        self.i = snapshot.i
+        self.relative_base = snapshot.relative_base
+        self.halted = snapshot.halted
+
+    def reset(self, patches: Optional[Mapping[int, int]] = None) -> None:
+        """Start the program over from the memory it was loaded with.
+
+        Only pages written since are rewritten, and the processor, its
+        channels and its decoded code are kept, so a run of many short
+        programs doesn't allocate a VM each. ``patches`` are then written
+        over the fresh memory.
+        """
+        code, template = self.code, self._template
+        for index in self._cached_cells():
+            original = template.get(index >> PAGE_BITS, ZERO_PAGE)
+            if code[index] != original[index & PAGE_MASK]:
+                self._forget(index)
+        # The previous patches are undone below, watched or not.
+        for index in self._patched:
+            self._drop_code(index)
+        self._patched.clear()
+        code.reset(template)
+        self.i = self.relative_base = 0
+        self.halted = False
+        self.inputs.clear()
+        self.outputs.clear()
+        self.started.clear()
+        self.suspended.clear()
+        for address, value in (patches or {}).items():
+            self._drop_code(address)
+            self._patched.add(address)
+            self[address] = value
+
+    def _decode(self, address: int) -> Instruction:
+        instruction = self._decoded[address] = decode(self.__getitem__, address)
+        cells = range(address, address + instruction.size)
+        if self.program is None or not self.program.read_only.issuperset(cells):
+            self._decoded_cells.update(cells)
+        return instruction
+
+    def run_until_blocked(self) -> Status:
+        """Execute synchronously until the program halts, waits or outputs.
+
+        Input is taken from ``inputs`` without waiting; when it is empty the
+        processor stops on the input instruction with ``Status.NEEDS_INPUT``
+        so it can be resumed once a value is available (see ``feed``).
+        """
+        if self.profiler is not None:
+            return self._run_profiled()[0]
+        decoded = self._decoded
+        while True:
+            start = self.i
+            instruction = decoded.get(start) or self._decode(start)
+            status = instruction.execute(self, *instruction.args)
+            if status is not None:
+                if status is Status.NEEDS_INPUT:
+                    self.i = start
+                return status
+
+    def _run_profiled(self, budget: Optional[int] = None) -> tuple[Status, int]:
+        """Interpret one instruction at a time, feeding the profiler.
+
+        Without a ``budget`` this stops like ``run_until_blocked``, with one
+        it runs a slice like ``run_slice``.
+        """
+        profiler, decoded = self.profiler, self._decoded
+        allocations = self.code.allocations
+        started = time.perf_counter()
+        executed = 0
+        try:
+            while budget is None or executed < budget:
+                address = self.i
+                instruction = decoded.get(address) or self._decode(address)
+                status = self.step()
+                if status is not Status.NEEDS_INPUT:
+                    profiler.record(address, instruction.op_code)
+                if status is Status.HALTED or status is Status.NEEDS_INPUT:
+                    return status, executed
+                executed += 1
+                # Only an output gets here; a slice stops on one when full.
+                if status is not None and (budget is None or self.outputs.full()):
+                    return status, executed
+            return Status.YIELDED, executed
+        finally:
+            profiler.compute_time += time.perf_counter() - started
+            profiler.page_allocations += self.code.allocations - allocations
+
+    def run_slice(self, budget: int) -> tuple[Status, int]:
+        """Run at most ``budget`` instructions, carrying on past outputs.
+
+        Returns why the slice ended, ``Status.YIELDED`` if the budget ran
+        out or ``Status.OUTPUT`` if a bounded output channel filled up, and
+        how many instructions were executed.
+        """
+        if self.profiler is not None:
+            return self._run_profiled(budget)
+        step = self.step
+        for executed in range(budget):
+            status = step()
+            if status is Status.HALTED or status is Status.NEEDS_INPUT:
+                return status, executed
+            if status is Status.OUTPUT and self.outputs.full():
+                return status, executed + 1
+        return Status.YIELDED, budget
+
+    def step(self) -> Optional[Status]:
+        """Interpret the single instruction at ``i``."""
+        start = self.i
+        instruction = self._decoded.get(start) or self._decode(start)
+        status = instruction.execute(self, *instruction.args)
+        if status is Status.NEEDS_INPUT:
+            self.i = start
+        return status
+
+    def feed(self, value: int) -> None:
+        """Complete the input instruction the processor is blocked on."""
+        instruction = self._decoded.get(self.i) or self._decode(self.i)
+        assert instruction.op_code == 3
+        if self.profiler is not None:
+            self.profiler.record(self.i, instruction.op_code)
+        (out,) = instruction.fetch(self, *instruction.args)
+        self.i += instruction.size
+        self[out] = value
+        if self.recorder is not None:
+            self.recorder.record(self, value)
+
+    async def run(self):
+        self.started.set()
+        while True:
+            status = self.run_until_blocked()
+            if status is Status.OUTPUT:
+                if self.outputs.full():
+                    # Suspended until the reader makes room.
+                    self.outputs.flush()
+                    waited = time.perf_counter()
+                    await self.outputs.wait_for_room()
+                    if self.profiler is not None:
+                        self.profiler.blocked_time += time.perf_counter() - waited
+                continue
+            if status is Status.HALTED:
+                self.outputs.flush()
+                return
+            if status is Status.NEEDS_INPUT:
+                # Hand everything written since the last wait over at once.
+                self.outputs.flush()
+                self.suspended.set()
+                waited = time.perf_counter()
+                value = await self.inputs.get()
+                if self.profiler is not None:
+                    self.profiler.blocked_time += time.perf_counter() - waited
+                self.feed(value)
+                self.suspended.clear()
+
+
+class Processor(BaseProcessor):
+    @handler(1, [ParamType.INPUT, ParamType.INPUT, ParamType.OUTPUT])
+    def add(self, a, b, out):
+        self[out] = a + b
+
+    @handler(2, [ParamType.INPUT, ParamType.INPUT, ParamType.OUTPUT])
+    def mul(self, a, b, out):
+        self[out] = a * b
+
+    @handler(3, [ParamType.OUTPUT])
+    def input(self, out):
+        try:
+            self[out] = value = self.inputs.get_nowait()
+        except asyncio.QueueEmpty:
+            return Status.NEEDS_INPUT
+        if self.recorder is not None:
+            self.recorder.record(self, value)
+
+    @handler(4, [ParamType.INPUT])
+    def output(self, a):
+        self.outputs.write(a)
+        return Status.OUTPUT
+
+    @handler(5, [ParamType.INPUT, ParamType.INPUT])
+    def jump_if_true(self, a, b):
+        if a != 0:
+            self.i = b
+
+    @handler(6, [ParamType.INPUT, ParamType.INPUT])
+    def jump_if_false(self, a, b):
+        if a == 0:
+            self.i = b
+
+    @handler(7, [ParamType.INPUT, ParamType.INPUT, ParamType.OUTPUT])
+    def less_than(self, a, b, out):
+        self[out] = 1 if a < b else 0
+
+    @handler(8, [ParamType.INPUT, ParamType.INPUT, ParamType.OUTPUT])
+    def equals(self, a, b, out):
+        self[out] = 1 if a == b else 0
+
+    @handler(9, [ParamType.INPUT])
+    def adjust_relative_base(self, b):
+        self.relative_base += b
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Profiler:
+    """Execution statistics collected while a processor runs.
+
+    Attach one with ``Processor(code, profiler=Profiler())``. Processors
+    without a profiler never touch this class.
+    """
+
+    op_codes: Counter[int] = field(default_factory=Counter)
+    addresses: Counter[int] = field(default_factory=Counter)
+    compute_time: float = 0.0
+    blocked_time: float = 0.0
+    page_allocations: int = 0
+
+    def record(self, address: int, op_code: int) -> None:
+        self.op_codes[op_code] += 1
+        self.addresses[address] += 1
+
+    @property
+    def instructions(self) -> int:
+        return sum(self.op_codes.values())
+
+    @property
+    def instructions_per_second(self) -> float:
+        return self.instructions / self.compute_time if self.compute_time else 0.0
+
+    def report(self, top: int = 10) -> dict:
+        return {
+            "instructions": self.instructions,
+            "instructions_per_second": self.instructions_per_second,
+            "compute_seconds": self.compute_time,
+            "blocked_seconds": self.blocked_time,
+            "page_allocations": self.page_allocations,
+            "op_codes": {
+                str(op_code): n for op_code, n in sorted(self.op_codes.items())
+            },
+            "hot_addresses": self.addresses.most_common(top),
+        }
+
+    def to_json(self, top: int = 10, **kwargs) -> str:
+        return json.dumps(self.report(top), **kwargs)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from .processor import BaseProcessor, Status
+
+# Instructions a processor may run before the next one gets a turn.
+QUANTUM = 1000
+
+
+@dataclass(eq=False)
+class Task:
+    """A processor on a ``Scheduler`` and what it has cost so far."""
+
+    processor: BaseProcessor
+    instructions: int = 0
+    slices: int = 0
+    # Times the processor stopped to wait for input, and for how long.
+    waits: int = 0
+    waiting_time: float = 0.0
+    # Times it stopped on a full bounded output channel, and for how long.
+    blocks: int = 0
+    blocked_time: float = 0.0
+    _waiting_since: float = field(init=False, repr=False, default=0.0)
+
+    @property
+    def halted(self) -> bool:
+        return self.processor.halted
+
+
+@dataclass
+class Scheduler:
+    """Run many processors on one thread in instruction quanta.
+
+    Runnable processors take turns round-robin, each running at most
+    ``quantum`` instructions (or until it waits for input or halts) before
+    going to the back of the queue, so none can starve the others. One
+    waiting for input is parked until a processor on the scheduler writes
+    to its input channel, or until ``run`` is called again with input
+    supplied from outside. Likewise one whose bounded output channel is
+    full is parked until the processor reading it has taken values.
+    """
+
+    quantum: int = QUANTUM
+    tasks: list[Task] = field(default_factory=list)
+    _runnable: deque[Task] = field(init=False, repr=False, default_factory=deque)
+    # Waiting tasks by the id of the input channel they wait on.
+    _waiting: dict[int, list[Task]] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    # Tasks blocked on a full channel by the id of their output channel.
+    _blocked: dict[int, list[Task]] = field(
+        init=False, repr=False, default_factory=dict
+    )
+
+    def add(self, processor: BaseProcessor) -> Task:
+        task = Task(processor)
+        self.tasks.append(task)
+        self._runnable.append(task)
+        return task
+
+    def extend(self, processors: Iterable[BaseProcessor]) -> list[Task]:
+        return [self.add(processor) for processor in processors]
+
+    @property
+    def waiting(self) -> list[Task]:
+        return [task for tasks in self._waiting.values() for task in tasks]
+
+    @property
+    def blocked(self) -> list[Task]:
+        return [task for tasks in self._blocked.values() for task in tasks]
+
+    def _park(self, task: Task) -> None:
+        task.waits += 1
+        task._waiting_since = time.perf_counter()
+        self._waiting.setdefault(id(task.processor.inputs), []).append(task)
+
+    def _wake(self, channel_id: int) -> None:
+        parked = self._waiting.pop(channel_id, None)
+        if not parked:
+            return
+        if parked[0].processor.inputs.empty():
+            self._waiting[channel_id] = parked
+            return
+        now = time.perf_counter()
+        for task in parked:
+            task.waiting_time += now - task._waiting_since
+            self._runnable.append(task)
+
+    def _block(self, task: Task) -> None:
+        task.blocks += 1
+        task._waiting_since = time.perf_counter()
+        self._blocked.setdefault(id(task.processor.outputs), []).append(task)
+
+    def _unblock(self, channel_id: int) -> None:
+        blocked = self._blocked.pop(channel_id, None)
+        if not blocked:
+            return
+        channel = blocked[0].processor.outputs
+        if channel.full():
+            self._blocked[channel_id] = blocked
+            return
+        now = time.perf_counter()
+        for task in blocked:
+            task.blocked_time += now - task._waiting_since
+            channel.write_blocked_time += now - task._waiting_since
+            self._runnable.append(task)
+
+    def run(self) -> None:
+        """Run until every processor has halted, waits for input or is
+        blocked on a full channel."""
+        for channel_id in list(self._waiting):
+            self._wake(channel_id)
+        for channel_id in list(self._blocked):
+            self._unblock(channel_id)
+
+        runnable = self._runnable
+        while runnable:
+            task = runnable.popleft()
+            processor = task.processor
+            status, executed = processor.run_slice(self.quantum)
+            task.instructions += executed
+            task.slices += 1
+            if status is Status.YIELDED:
+                runnable.append(task)
+            elif status is Status.NEEDS_INPUT:
+                self._park(task)
+            elif status is Status.OUTPUT:
+                self._block(task)
+            self._wake(id(processor.outputs))
+            self._unblock(id(processor.inputs))
@@ -0,0 +1,419 @@
+"""Serve Intcode sessions to local clients from pools of warm VMs.
+
+Start a server holding the programs it should run::
+
+    python -m intcode.service d9=d9/input.txt d15=d15/input.txt \\
+        --socket /tmp/intcode.sock
+
+and drive sessions through ``Client``, whose sessions have the ``inputs``,
+``outputs`` and ``run`` of a processor::
+
+    client = await Client.connect("/tmp/intcode.sock")
+    boost = await client.open("d9")
+    boost.inputs.put_nowait(1)
+    await boost.run()
+    print(boost.outputs.get_nowait())
+
+Requests and replies are JSON objects, one per line, matched by ``id`` so
+any number of sessions can share a connection with requests in flight:
+
+* ``open`` a session on ``program``, answered with its ``session`` id
+* ``feed`` it ``values`` to read as input
+* ``run`` it until it halts or needs input, answered with the ``status``
+* ``drain`` the ``outputs`` it has written
+* ``stats`` for the session, and ``close`` it, answered with its stats
+* ``programs`` held by the server
+
+A failed request is answered with an ``error`` message instead. If the
+VM itself fails, its session is closed and the VM dropped from the pool.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Mapping, Optional
+
+from .backends import create
+from .channel import Channel
+from .processor import BaseProcessor, Status, load
+
+# Instructions a session runs before other sessions get a turn.
+QUANTUM = 10_000
+# Idle VMs kept ready per program.
+POOL_SIZE = 4
+
+
+class ServiceError(Exception):
+    """A request the server answered with an error."""
+
+
+class _Crashed(Exception):
+    """The VM raised while running a session's program."""
+
+    def __init__(self, error: Exception):
+        super().__init__(f"{type(error).__name__}: {error}")
+
+
+class Pool:
+    """Ready VMs for one program.
+
+    VMs are forks of a template that never runs, so they share its pages
+    copy-on-write. A VM is rolled back to the loaded program when its
+    session closes and kept for the next one, together with its decoded
+    and compiled code, so later sessions start warm.
+    """
+
+    def __init__(
+        self, code: list[int], size: int = POOL_SIZE, backend: Optional[str] = None
+    ):
+        self.size = size
+        self.template = create(code, backend=backend)
+        self._loaded = self.template.snapshot()
+        self._ready: deque[BaseProcessor] = deque(
+            self.template.fork() for _ in range(size)
+        )
+        self.forks = size
+        self.recycled = 0
+        # VMs dropped after failing, replaced by fresh forks when needed.
+        self.discarded = 0
+
+    def acquire(self) -> BaseProcessor:
+        if self._ready:
+            return self._ready.popleft()
+        self.forks += 1
+        return self.template.fork()
+
+    def release(self, processor: BaseProcessor) -> None:
+        if len(self._ready) >= self.size:
+            return
+        processor.restore(self._loaded)
+        processor.inputs, processor.outputs = Channel(), Channel()
+        processor.started, processor.suspended = asyncio.Event(), asyncio.Event()
+        self._ready.append(processor)
+        self.recycled += 1
+
+
+@dataclass
+class SessionStats:
+    requests: int = 0
+    instructions: int = 0
+    inputs: int = 0
+    outputs: int = 0
+    compute_time: float = 0.0
+
+
+@dataclass(eq=False)
+class _Session:
+    program: str
+    processor: BaseProcessor
+    stats: SessionStats = field(default_factory=SessionStats)
+    status: Optional[Status] = None
+    # Requests on one session run one at a time, in the order they arrived.
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class Service:
+    """Sessions on pooled VMs, answering requests from any connection."""
+
+    def __init__(
+        self,
+        programs: Mapping[str, list[int]],
+        pool_size: int = POOL_SIZE,
+        backend: Optional[str] = None,
+        quantum: int = QUANTUM,
+    ):
+        self.pools = {
+            name: Pool(code, pool_size, backend) for name, code in programs.items()
+        }
+        self.quantum = quantum
+        self.sessions: dict[int, _Session] = {}
+        self._ids = itertools.count(1)
+
+    async def handle(self, request: Mapping[str, Any]) -> dict[str, Any]:
+        """Answer one request, echoing its ``id``."""
+        reply: dict[str, Any] = {"id": request.get("id")}
+        try:
+            op = request["op"]
+            if op == "programs":
+                reply["programs"] = sorted(self.pools)
+            elif op == "open":
+                reply["session"] = self.open(request["program"])
+            else:
+                reply.update(await self._on_session(op, request))
+        except _Crashed as e:
+            # The VM may have stopped part way through an instruction, so
+            # it isn't trusted again.
+            self.discard(request["session"])
+            reply["error"] = str(e)
+        except Exception as e:
+            # Malformed requests, mostly; answered so the client never waits.
+            reply["error"] = f"{type(e).__name__}: {e}"
+        return reply
+
+    def open(self, program: str) -> int:
+        try:
+            pool = self.pools[program]
+        except KeyError:
+            raise ValueError(f"Unknown program {program!r}") from None
+        session_id = next(self._ids)
+        self.sessions[session_id] = _Session(program, pool.acquire())
+        return session_id
+
+    async def _on_session(
+        self, op: str, request: Mapping[str, Any]
+    ) -> dict[str, Any]:
+        session_id = request["session"]
+        try:
+            session = self.sessions[session_id]
+        except KeyError:
+            raise ValueError(f"Unknown session {session_id!r}") from None
+        async with session.lock:
+            if session_id not in self.sessions:
+                raise ValueError(f"Session {session_id!r} was closed")
+            session.stats.requests += 1
+            processor = session.processor
+            if op == "feed":
+                values = [int(value) for value in request["values"]]
+                for value in values:
+                    processor.inputs.put_nowait(value)
+                session.stats.inputs += len(values)
+                return {}
+            if op == "run":
+                return {"status": (await self._run(session)).name}
+            if op == "drain":
+                outputs = []
+                while not processor.outputs.empty():
+                    outputs.append(processor.outputs.get_nowait())
+                session.stats.outputs += len(outputs)
+                return {"outputs": outputs}
+            if op == "stats":
+                return {"stats": self._stats(session)}
+            if op == "close":
+                return {"stats": self.close(session_id)}
+        raise ValueError(f"Unknown request {op!r}")
+
+    async def _run(self, session: _Session) -> Status:
+        """Run in quanta, letting other sessions in between."""
+        processor, stats = session.processor, session.stats
+        while True:
+            started = time.perf_counter()
+            try:
+                status, executed = processor.run_slice(self.quantum)
+            except Exception as e:
+                raise _Crashed(e) from e
+            stats.compute_time += time.perf_counter() - started
+            stats.instructions += executed
+            if status is not Status.YIELDED:
+                session.status = status
+                return status
+            await asyncio.sleep(0)
+
+    def _stats(self, session: _Session) -> dict[str, Any]:
+        status = session.status.name if session.status is not None else None
+        return {"program": session.program, "status": status, **asdict(session.stats)}
+
+    def close(self, session_id: int) -> dict[str, Any]:
+        session = self.sessions.pop(session_id)
+        self.pools[session.program].release(session.processor)
+        return self._stats(session)
+
+    def discard(self, session_id: Optional[int]) -> None:
+        """End a session without returning its VM to the pool."""
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.pools[session.program].discarded += 1
+
+    async def serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer requests from one connection, each as soon as it is done.
+
+        Sessions opened on the connection are closed when it drops.
+        """
+        opened: set[int] = set()
+        tasks: set[asyncio.Task] = set()
+
+        async def reply(message: Mapping[str, Any]) -> None:
+            writer.write(json.dumps(message).encode() + b"\n")
+            await writer.drain()
+
+        async def respond(request: Mapping[str, Any]) -> None:
+            answer = await self.handle(request)
+            if "error" not in answer:
+                if request["op"] == "open":
+                    opened.add(answer["session"])
+                elif request["op"] == "close":
+                    opened.discard(request["session"])
+            await reply(answer)
+
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    await reply({"id": None, "error": f"ValueError: {e}"})
+                    continue
+                task = asyncio.create_task(respond(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for session_id in opened & self.sessions.keys():
+                self.close(session_id)
+            writer.close()
+
+
+async def start(
+    service: Service,
+    path: Optional[str] = None,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> asyncio.AbstractServer:
+    """Listen on the Unix socket ``path``, or on ``host``:``port`` without one."""
+    if path is not None:
+        return await asyncio.start_unix_server(service.serve, path)
+    return await asyncio.start_server(service.serve, host, port)
+
+
+class RemoteProcessor:
+    """A session on the server, used like a local processor.
+
+    Values put on ``inputs`` are sent when the program needs them and
+    everything it writes arrives on ``outputs``.
+    """
+
+    def __init__(self, client: Client, session: int):
+        self.client = client
+        self.session = session
+        self.inputs = Channel()
+        self.outputs = Channel()
+        self.halted = False
+
+    async def _exchange(self, values: list[int]) -> Status:
+        """Feed ``values``, run and collect the outputs in one round trip."""
+        request, session = self.client.request, self.session
+        # Sent back to back; the server runs a session's requests in order.
+        feed = [request("feed", session=session, values=values)] if values else []
+        *_, ran, drained = await asyncio.gather(
+            *feed, request("run", session=session), request("drain", session=session)
+        )
+        for value in drained["outputs"]:
+            self.outputs.write(value)
+        self.outputs.flush()
+        status = Status[ran["status"]]
+        self.halted = status is Status.HALTED
+        return status
+
+    async def run_until_blocked(self) -> Status:
+        """Run with the values queued on ``inputs`` until halted or waiting."""
+        values = []
+        while not self.inputs.empty():
+            values.append(self.inputs.get_nowait())
+        return await self._exchange(values)
+
+    async def run(self) -> None:
+        status = await self.run_until_blocked()
+        while status is not Status.HALTED:
+            status = await self._exchange(await self.inputs.get_many())
+
+    async def stats(self) -> dict[str, Any]:
+        return (await self.client.request("stats", session=self.session))["stats"]
+
+    async def close(self) -> dict[str, Any]:
+        return (await self.client.request("close", session=self.session))["stats"]
+
+
+class Client:
+    """A connection to a ``Service``, carrying any number of sessions."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count(1)
+        self._pending: dict[int, asyncio.Future] = {}
+        self._receiving = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def connect(
+        cls, path: Optional[str] = None, host: str = "127.0.0.1", port: int = 0
+    ) -> Client:
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _receive(self) -> None:
+        try:
+            while line := await self._reader.readline():
+                reply = json.loads(line)
+                future = self._pending.pop(reply["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection closed"))
+            self._pending.clear()
+
+    async def request(self, op: str, **fields: Any) -> dict[str, Any]:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        message = {"id": request_id, "op": op, **fields}
+        self._writer.write(json.dumps(message).encode() + b"\n")
+        await self._writer.drain()
+        reply = await future
+        if "error" in reply:
+            raise ServiceError(reply["error"])
+        return reply
+
+    async def programs(self) -> list[str]:
+        return (await self.request("programs"))["programs"]
+
+    async def open(self, program: str) -> RemoteProcessor:
+        reply = await self.request("open", program=program)
+        return RemoteProcessor(self, reply["session"])
+
+    async def close(self) -> None:
+        self._writer.close()
+        await self._writer.wait_closed()
+        await self._receiving
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve Intcode sessions.")
+    parser.add_argument(
+        "programs", nargs="+", metavar="NAME=PATH", help="programs to serve"
+    )
+    parser.add_argument("--socket", help="listen on this Unix socket")
+    parser.add_argument("--port", type=int, default=0, help="or on this TCP port")
+    parser.add_argument("--pool", type=int, default=POOL_SIZE)
+    parser.add_argument("--backend")
+    args = parser.parse_args(argv)
+
+    programs = {}
+    for spec in args.programs:
+        name, _, path = spec.partition("=")
+        programs[name] = load(Path(path or name))
+
+    async def serve() -> None:
+        service = Service(programs, args.pool, args.backend)
+        server = await start(service, args.socket, port=args.port)
+        for sock in server.sockets:
+            print(f"serving {', '.join(programs)} on {sock.getsockname()}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import itertools
+from collections import defaultdict
+from typing import Iterable, Mapping, Optional, Union
+
+from .processor import HALT, IMMEDIATE_MODE, POSITION_MODE, parse_op_code
+
+Monomial = tuple[str, ...]
+
+
+class Unsupported(Exception):
+    """The program does something the symbolic run can't follow."""
+
+
+class Polynomial:
+    """Integer polynomial over named memory cells, e.g. ``noun * 3 + verb``."""
+
+    def __init__(self, terms: Mapping[Monomial, int]):
+        self.terms = {monomial: c for monomial, c in terms.items() if c}
+
+    @classmethod
+    def symbol(cls, name: str) -> Polynomial:
+        return cls({(name,): 1})
+
+    @classmethod
+    def constant(cls, value: int) -> Polynomial:
+        return cls({(): value})
+
+    def __add__(self, other: Polynomial) -> Polynomial:
+        terms = defaultdict(int, self.terms)
+        for monomial, coefficient in other.terms.items():
+            terms[monomial] += coefficient
+        return Polynomial(terms)
+
+    def __mul__(self, other: Polynomial) -> Polynomial:
+        terms: defaultdict[Monomial, int] = defaultdict(int)
+        for (left, a), (right, b) in itertools.product(
+            self.terms.items(), other.terms.items()
+        ):
+            terms[tuple(sorted(left + right))] += a * b
+        return Polynomial(terms)
+
+    def is_constant(self) -> bool:
+        return all(not monomial for monomial in self.terms)
+
+    def is_affine(self) -> bool:
+        return all(len(monomial) <= 1 for monomial in self.terms)
+
+    def coefficient(self, monomial: Monomial) -> int:
+        return self.terms.get(monomial, 0)
+
+    def __repr__(self) -> str:
+        return " + ".join(
+            f"{c}*{'*'.join(m)}" if m else str(c) for m, c in self.terms.items()
+        ) or "0"
+
+
+# A cell computed from memory at a symbolic address. Harmless unless it is
+# used, which d2 relies on: its first instruction reads ``code[noun]``.
+UNKNOWN = object()
+
+Cell = Union[Polynomial, object]
+
+
+def _combine(op_code: int, a: Cell, b: Cell) -> Cell:
+    if a is UNKNOWN or b is UNKNOWN:
+        return UNKNOWN
+    return a + b if op_code == 1 else a * b
+
+
+def _concrete(cell: Cell) -> int:
+    if cell is UNKNOWN or not cell.is_constant():
+        raise Unsupported(cell)
+    return cell.coefficient(())
+
+
+def run_symbolic(code: list[int], symbols: Mapping[int, str]) -> list[Cell]:
+    """Run an add/mul program with ``symbols`` cells left as unknowns.
+
+    Returns the final memory with every cell as a ``Polynomial`` (or
+    ``UNKNOWN``). Raises ``Unsupported`` for other instructions, symbolic
+    opcodes or writes to symbolic addresses.
+    """
+    memory: list[Cell] = [Polynomial.constant(value) for value in code]
+    for address, name in symbols.items():
+        memory[address] = Polynomial.symbol(name)
+
+    def read(value: Cell, mode: int) -> Cell:
+        if mode == IMMEDIATE_MODE:
+            return value
+        if mode != POSITION_MODE:
+            raise Unsupported(mode)
+        if value is UNKNOWN or not value.is_constant():
+            return UNKNOWN
+        return memory[_concrete(value)]
+
+    i = 0
+    while True:
+        op_code, modes = parse_op_code(_concrete(memory[i]))
+        if op_code == HALT:
+            return memory
+        if op_code not in (1, 2) or modes[2] != POSITION_MODE:
+            raise Unsupported(op_code)
+        a = read(memory[i + 1], modes[0])
+        b = read(memory[i + 2], modes[1])
+        memory[_concrete(memory[i + 3])] = _combine(op_code, a, b)
+        i += 4
+
+
+def solve(
+    code: list[int],
+    target: int,
+    symbols: Mapping[int, str],
+    domain: Iterable[int] = range(100),
+    output: int = 0,
+) -> Optional[dict[str, int]]:
+    """Find symbol values in ``domain`` that make ``code[output]`` hit ``target``.
+
+    The program is run once symbolically; the result is solved directly when
+    it is affine in the symbols. Returns None when the program can't be
+    handled this way, so callers can fall back to running it for every
+    candidate, or when no solution exists in ``domain``.
+    """
+    try:
+        result = run_symbolic(code, symbols)[output]
+    except (Unsupported, IndexError):
+        return None
+    if result is UNKNOWN or not result.is_affine():
+        return None
+
+    domain = list(domain)
+    names = list(dict.fromkeys(symbols.values()))
+    *free, last = names
+    slope = result.coefficient((last,))
+    for values in itertools.product(domain, repeat=len(free)):
+        remainder = target - result.coefficient(()) - sum(
+            result.coefficient((name,)) * value for name, value in zip(free, values)
+        )
+        if slope == 0:
+            if remainder == 0:
+                return {**dict(zip(free, values)), last: domain[0]}
+        elif remainder % slope == 0 and remainder // slope in domain:
+            return {**dict(zip(free, values)), last: remainder // slope}
+    return None
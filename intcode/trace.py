@@ -0,0 +1,116 @@
+"""Record the inputs of an Intcode session and replay it from disk.
+
+Attach a recorder to log every input a processor consumes, together with
+periodic checkpoints of its state::
+
+    processor = create(code, recorder=Recorder(Path("d13/trace")))
+
+``replay`` then rebuilds the processor as it was after any number of those
+inputs, starting from the nearest checkpoint and feeding the logged inputs
+without the controller that produced them.
+"""
+from __future__ import annotations
+
+import os
+import pickle
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Optional, Union
+
+from .backends import create
+from .memory import ZERO_PAGE
+from .processor import BaseProcessor, Snapshot, Status
+
+INPUTS = "inputs"
+CHECKPOINT = "checkpoint-{:08}.pickle"
+CHECKPOINTS = "checkpoint-*.pickle"
+
+
+@dataclass
+class Recorder:
+    """Log inputs to ``directory`` and checkpoint every ``every`` of them.
+
+    The processor writes checkpoint 0 when it is created with the recorder.
+    Checkpoints are taken straight after an input instruction completes, so
+    a checkpoint numbered ``n`` resumes with the ``n``-th logged input.
+    """
+
+    directory: Path
+    every: int = 1000
+    count: int = field(init=False, default=0)
+    _log: IO[str] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.directory = Path(self.directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for old in self.directory.glob(CHECKPOINTS):
+            old.unlink()
+        self._log = (self.directory / INPUTS).open("w")
+
+    def record(self, processor: BaseProcessor, value: int) -> None:
+        # Flushed every time, a crashed controller shouldn't lose its inputs.
+        self._log.write(f"{value}\n")
+        self._log.flush()
+        self.count += 1
+        if self.count % self.every == 0:
+            self.checkpoint(processor)
+
+    def checkpoint(self, processor: BaseProcessor) -> None:
+        snapshot = processor.snapshot()
+        pages = {n: page for n, page in snapshot.pages.items() if page is not ZERO_PAGE}
+        path = self.directory / CHECKPOINT.format(self.count)
+        partial = path.with_suffix(".partial")
+        with partial.open("wb") as f:
+            pickle.dump(
+                Snapshot(pages, snapshot.i, snapshot.relative_base, snapshot.halted),
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(partial, path)
+
+    def close(self) -> None:
+        self._log.close()
+
+
+def read_inputs(directory: Union[str, Path]) -> list[int]:
+    with (Path(directory) / INPUTS).open("r") as f:
+        return [int(line) for line in f]
+
+
+def nearest_checkpoint(directory: Union[str, Path], count: int) -> tuple[int, Snapshot]:
+    """Load the latest checkpoint taken at or before ``count`` inputs."""
+    taken = sorted(
+        int(path.stem.split("-")[1])
+        for path in Path(directory).glob(CHECKPOINTS)
+    )
+    best = max((n for n in taken if n <= count), default=None)
+    if best is None:
+        raise FileNotFoundError(f"No checkpoint in {directory}")
+    with (Path(directory) / CHECKPOINT.format(best)).open("rb") as f:
+        return best, pickle.load(f)
+
+
+def replay(
+    directory: Union[str, Path],
+    upto: Optional[int] = None,
+    backend: Optional[str] = None,
+) -> BaseProcessor:
+    """Rebuild the recorded processor as it was after ``upto`` inputs.
+
+    By default every logged input is replayed. The processor is left
+    waiting for the next input (or halted). Outputs written since the
+    checkpoint it started from are in its ``outputs`` channel; earlier
+    ones are not reproduced.
+    """
+    inputs = read_inputs(directory)
+    upto = len(inputs) if upto is None else min(upto, len(inputs))
+    start, snapshot = nearest_checkpoint(directory, upto)
+
+    processor = create([], backend=backend)
+    processor.restore(snapshot)
+    for value in inputs[start:upto]:
+        processor.inputs.put_nowait(value)
+    if not processor.halted:
+        while processor.run_until_blocked() is Status.OUTPUT:
+            pass
+    return processor
@@ -0,0 +1,253 @@
+"""Run many instances of one program in lockstep with NumPy.
+
+Needs NumPy, unlike the rest of the package, so it is only imported on
+request::
+
+    from intcode.vector import run_lockstep
+"""
+from __future__ import annotations
+
+from typing import Sequence
+
+import numpy as np
+
+from .backends import create
+from .batch import Job, Result, run_job
+from .memory import PAGE_SIZE
+from .processor import HALT, IMMEDIATE_MODE, RELATIVE_MODE, Status
+
+INT64 = np.iinfo(np.int64)
+# Parameters each opcode reads from memory after the opcode itself.
+PARAMS = {1: 3, 2: 3, 3: 1, 4: 1, 5: 2, 6: 2, 7: 3, 8: 3, 9: 1}
+# Cells past the end of the code every row may grow to. Rows are dense, so
+# instances using addresses beyond are left to the scalar interpreter,
+# whose memory is sparse.
+HEADROOM = 16 * PAGE_SIZE
+
+
+def _fits(value: int) -> bool:
+    return INT64.min <= value <= INT64.max
+
+
+def _representable(job: Job, limit: int) -> bool:
+    """Whether ``job`` can start in int64 rows of ``limit`` cells at all."""
+    return all(
+        0 <= address < limit and _fits(value)
+        for address, value in job.patches.items()
+    ) and all(map(_fits, job.inputs))
+
+
+class _Lockstep:
+    """Memories as rows of one int64 array, each instance one step at a time.
+
+    Every round, the instances that are still running are grouped by
+    instruction pointer and raw opcode, and each group executes its
+    instruction with a few array operations. An instance whose arithmetic
+    leaves 64 bits, or that uses a negative address or one past ``limit``, is
+    handed to the scalar interpreter to finish; one whose code, patches or
+    inputs don't fit runs there from the start.
+    """
+
+    def __init__(self, code: list[int], jobs: Sequence[Job]):
+        count = len(jobs)
+        self.jobs = jobs
+        self.ip = np.zeros(count, dtype=np.int64)
+        self.relative_base = np.zeros(count, dtype=np.int64)
+        self.cursor = np.zeros(count, dtype=np.int64)
+        self.running = np.ones(count, dtype=bool)
+        self.halted = np.zeros(count, dtype=bool)
+        self.outputs: list[list[int]] = [[] for _ in jobs]
+        # Instances finished by the scalar interpreter instead.
+        self.results: dict[int, Result] = {}
+        self.limit = len(code) + HEADROOM
+        self.memory = np.zeros((count, max(len(code), 1)), dtype=np.int64)
+        wide = not all(map(_fits, code))
+        if not wide:
+            self.memory[:] = np.array(code, dtype=np.int64)
+        for row, job in enumerate(jobs):
+            if wide or not _representable(job, self.limit):
+                self.results[row] = run_job(code, job)
+                self.running[row] = False
+                continue
+            for address, value in job.patches.items():
+                self._reserve(address)
+                self.memory[row, address] = value
+
+    def _reserve(self, address) -> None:
+        """Grow every memory to hold ``address``; unwritten cells read as 0."""
+        highest = int(np.max(address)) if np.size(address) else -1
+        columns = self.memory.shape[1]
+        if highest >= columns:
+            grown = max(highest + 1, 2 * columns)
+            self.memory = np.pad(self.memory, ((0, 0), (0, grown - columns)))
+
+    def _cells(self, rows: np.ndarray, start: int, count: int) -> np.ndarray:
+        self._reserve(start + count - 1)
+        return self.memory[rows, start : start + count]
+
+    def _address(self, rows, mode: int, raw: np.ndarray) -> np.ndarray:
+        address = raw + self.relative_base[rows] if mode == RELATIVE_MODE else raw
+        self._reserve(address)
+        return address
+
+    def _read(self, rows, mode: int, raw: np.ndarray) -> np.ndarray:
+        if mode == IMMEDIATE_MODE:
+            return raw
+        # Resolve first: reserving may replace ``self.memory``.
+        address = self._address(rows, mode, raw)
+        return self.memory[rows, address]
+
+    def _write(self, rows, mode: int, raw: np.ndarray, values: np.ndarray) -> None:
+        address = self._address(rows, mode, raw)
+        self.memory[rows, address] = values
+
+    def run(self) -> list[Result]:
+        while self.running.any():
+            rows = np.flatnonzero(self.running)
+            ips = self.ip[rows]
+            outside = (ips < 0) | (ips + 3 >= self.limit)
+            if outside.any():
+                self._escape(rows[outside])
+                rows, ips = rows[~outside], ips[~outside]
+                if not rows.size:
+                    continue
+            self._reserve(ips + 3)
+            raws = self.memory[rows, ips]
+            keys = np.stack([ips, raws], axis=1)
+            groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            for group, (ip, raw) in enumerate(groups):
+                self._step(rows[inverse == group], int(ip), int(raw))
+        return [
+            self.results.get(row) or self._result(row) for row in range(len(self.jobs))
+        ]
+
+    def _result(self, row: int) -> Result:
+        job = self.jobs[row]
+        return Result(
+            tuple(self.outputs[row]),
+            {address: self._peek(row, address) for address in job.read},
+            bool(self.halted[row]),
+        )
+
+    def _peek(self, row: int, address: int) -> int:
+        if 0 <= address < self.memory.shape[1]:
+            return int(self.memory[row, address])
+        # Cells outside the rows are never written: writing one escapes the row.
+        return 0
+
+    def _step(self, rows: np.ndarray, ip: int, raw: int) -> None:
+        op_code, modes = raw % 100, [raw // 100 % 10, raw // 1000 % 10, raw // 10000]
+        if op_code == HALT:
+            self.running[rows] = False
+            self.halted[rows] = True
+            return
+        params = self._cells(rows, ip + 1, 3)
+        outside = self._outside(rows, op_code, modes, params)
+        if outside.any():
+            self._escape(rows[outside])
+            rows, params = rows[~outside], params[~outside]
+            if not rows.size:
+                return
+
+        if op_code in (1, 2, 7, 8):
+            a = self._read(rows, modes[0], params[:, 0])
+            b = self._read(rows, modes[1], params[:, 1])
+            if op_code == 1:
+                values = a + b
+                overflow = ((a >= 0) == (b >= 0)) & ((values >= 0) != (a >= 0))
+            elif op_code == 2:
+                values = a * b
+                nonzero = a != 0
+                overflow = nonzero & (
+                    (values // np.where(nonzero, a, 1) != b)
+                    | ((a == -1) & (b == INT64.min))
+                    | ((b == -1) & (a == INT64.min))
+                )
+            elif op_code == 7:
+                values, overflow = (a < b).astype(np.int64), None
+            else:
+                values, overflow = (a == b).astype(np.int64), None
+            if overflow is not None and overflow.any():
+                self._escape(rows[overflow])
+                keep = ~overflow
+                rows, params, values = rows[keep], params[keep], values[keep]
+            self._write(rows, modes[2], params[:, 2], values)
+            self.ip[rows] = ip + 4
+        elif op_code in (5, 6):
+            test = self._read(rows, modes[0], params[:, 0])
+            target = self._read(rows, modes[1], params[:, 1])
+            jump = test != 0 if op_code == 5 else test == 0
+            self.ip[rows] = np.where(jump, target, ip + 3)
+        elif op_code == 9:
+            self.relative_base[rows] += self._read(rows, modes[0], params[:, 0])
+            self.ip[rows] = ip + 2
+        elif op_code == 3:
+            self._input(rows, ip, modes[0], params[:, 0])
+        elif op_code == 4:
+            values = self._read(rows, modes[0], params[:, 0])
+            for row, value in zip(rows.tolist(), values.tolist()):
+                self.outputs[row].append(value)
+            self.ip[rows] = ip + 2
+        else:
+            raise KeyError(op_code)
+
+    def _outside(
+        self, rows: np.ndarray, op_code: int, modes: list[int], params: np.ndarray
+    ) -> np.ndarray:
+        """Rows whose instruction would touch a cell outside the rows."""
+        outside = np.zeros(len(rows), dtype=bool)
+        for index in range(PARAMS.get(op_code, 0)):
+            if modes[index] == IMMEDIATE_MODE:
+                continue
+            address = params[:, index]
+            if modes[index] == RELATIVE_MODE:
+                address = address + self.relative_base[rows]
+            outside |= (address < 0) | (address >= self.limit)
+        return outside
+
+    def _input(self, rows: np.ndarray, ip: int, mode: int, raw: np.ndarray) -> None:
+        available = np.array(
+            [self.cursor[row] < len(self.jobs[row].inputs) for row in rows.tolist()],
+            dtype=bool,
+        )
+        # Out of input: stop on the instruction, like ``Status.NEEDS_INPUT``.
+        self.running[rows[~available]] = False
+        rows, raw = rows[available], raw[available]
+        values = np.array(
+            [self.jobs[row].inputs[self.cursor[row]] for row in rows.tolist()],
+            dtype=np.int64,
+        )
+        self._write(rows, mode, raw, values)
+        self.cursor[rows] += 1
+        self.ip[rows] = ip + 2
+
+    def _escape(self, rows: np.ndarray) -> None:
+        """Finish ``rows`` on the scalar interpreter.
+
+        Its cells are big ints and it takes any address, so it picks up from
+        the instruction these rows couldn't execute.
+        """
+        for row in rows.tolist():
+            job = self.jobs[row]
+            processor = create(self.memory[row].tolist())
+            processor.i = int(self.ip[row])
+            processor.relative_base = int(self.relative_base[row])
+            for value in job.inputs[int(self.cursor[row]) :]:
+                processor.inputs.put_nowait(value)
+            while (status := processor.run_until_blocked()) is Status.OUTPUT:
+                pass
+            outputs = list(self.outputs[row])
+            while not processor.outputs.empty():
+                outputs.append(processor.outputs.get_nowait())
+            self.results[row] = Result(
+                tuple(outputs),
+                {address: processor[address] for address in job.read},
+                status is Status.HALTED,
+            )
+            self.running[row] = False
+
+
+def run_lockstep(code: list[int], jobs: Sequence[Job]) -> list[Result]:
+    """Run every job on ``code`` together; results match ``batch.run_job``."""
+    return _Lockstep(code, jobs).run()
@@ -0,0 +1,32 @@
+import pytest
+
+from intcode import BACKENDS, create
+from intcode.analysis import analyse
+from intcode.processor import Status
+
+# The add at 6 rewrites the write operand of the add at 2, which then writes
+# the output operand at 1 instead of 50 on later passes of the loop.
+CODE = [104, 7, 1101, 1, 0, 50, 1101, 1, 0, 5, 1001, 60, 1, 60, 1007, 60, 3, 61]
+CODE += [1005, 61, 0, 99]
+
+
+def run(processor):
+    while processor.run_until_blocked() is not Status.HALTED:
+        pass
+    outputs = []
+    while not processor.outputs.empty():
+        outputs.append(processor.outputs.get_nowait())
+    return outputs
+
+
+def test_rewritten_write_operand_leaves_map_incomplete():
+    program = analyse(CODE)
+    assert program.steering_writes == {6}
+    assert not program.complete
+    assert not program.read_only
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_backends_follow_retargeted_writes(backend):
+    processor = create(CODE, backend=backend, program=analyse(CODE))
+    assert run(processor) == [7, 7, 1]
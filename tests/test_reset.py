@@ -0,0 +1,32 @@
+import pytest
+
+from intcode import BACKENDS, create
+from intcode.analysis import analyse
+from intcode.processor import Status
+
+# Adds cells 9 and 10 into 11 and outputs it; the program map proves the
+# instructions read-only, so patching an operand isn't watched.
+CODE = [1, 9, 10, 11, 4, 11, 99, 0, 0, 5, 6, 0]
+
+
+def run(processor):
+    while processor.run_until_blocked() is not Status.HALTED:
+        pass
+    outputs = []
+    while not processor.outputs.empty():
+        outputs.append(processor.outputs.get_nowait())
+    return outputs
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_reset_patches_read_only_code(backend):
+    processor = create(CODE, backend=backend, program=analyse(CODE))
+    # Run often enough for the compiled backend to build a block.
+    for _ in range(10):
+        processor.reset()
+        assert run(processor) == [11]
+
+    processor.reset({1: 10})
+    assert run(processor) == [12]
+    processor.reset()
+    assert run(processor) == [11]